@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Archivo de respuestas por DNI para grabar y reproducir consultas
+En modo grabación se guarda la página de resultado (y la respuesta XHR del Congreso);
+en modo reproducción los scrapers extraen de ahí sin abrir Chrome
+"""
+
+import os
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+SITIO_ELDNI = 'eldni'
+SITIO_CONGRESO = 'congreso'
+MODOS = ('grabar', 'reproducir')
+# Valor de la columna de resultado para un DNI que no está en el archivo que se reproduce
+SIN_GRABACION = 'SIN_GRABACION'
+
+# page_source no incluye lo escrito por JS en los inputs: se copia el valor al atributo antes de leerlo
+SCRIPT_FIJAR_VALORES = (
+    "document.querySelectorAll('input, textarea').forEach("
+    "function (e) { e.setAttribute('value', e.value); });"
+)
+
+
+def html_con_valores(driver) -> str:
+    """HTML de la página actual con el valor vigente de cada input"""
+    driver.execute_script(SCRIPT_FIJAR_VALORES)
+    return driver.page_source
+
+
+def _comprimir(texto: Optional[str]) -> Optional[bytes]:
+    return zlib.compress(texto.encode('utf-8'), 6) if texto is not None else None
+
+
+def _descomprimir(datos: Optional[bytes]) -> Optional[str]:
+    return zlib.decompress(datos).decode('utf-8') if datos is not None else None
+
+
+class ArchivoRespuestas:
+    """Respuestas comprimidas en SQLite, indexadas por (sitio, dni)"""
+
+    def __init__(self, ruta, modo: str = 'grabar'):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de archivo desconocido: {modo} (usar {' o '.join(MODOS)})")
+        if modo == 'reproducir' and not Path(ruta).exists():
+            raise FileNotFoundError(f"No se encuentra el archivo de respuestas: {ruta}")
+
+        self.ruta = str(ruta)
+        self.modo = modo
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._conexion = sqlite3.connect(self.ruta, check_same_thread=False)
+        with self._lock:
+            self._conexion.execute("PRAGMA journal_mode=WAL")
+            self._conexion.execute("""
+                CREATE TABLE IF NOT EXISTS respuestas (
+                    sitio TEXT NOT NULL,
+                    dni TEXT NOT NULL,
+                    creado REAL NOT NULL,
+                    estado_http INTEGER,
+                    html BLOB,
+                    cuerpo BLOB,
+                    PRIMARY KEY (sitio, dni)
+                )
+            """)
+            self._conexion.commit()
+
+    @property
+    def grabando(self) -> bool:
+        return self.modo == 'grabar'
+
+    @property
+    def reproduciendo(self) -> bool:
+        return self.modo == 'reproducir'
+
+    def guardar(self, sitio: str, dni: str, html: Optional[str] = None, cuerpo: Optional[str] = None,
+                estado_http: Optional[int] = None):
+        """Guardar (o reemplazar) la respuesta de un DNI"""
+        fila = (sitio, dni, time.time(), estado_http, _comprimir(html), _comprimir(cuerpo))
+        with self._lock:
+            self._conexion.execute(
+                "INSERT OR REPLACE INTO respuestas (sitio, dni, creado, estado_http, html, cuerpo) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                fila
+            )
+            self._conexion.commit()
+
+    def leer(self, sitio: str, dni: str) -> Optional[dict]:
+        """Respuesta grabada de un DNI: {'html', 'cuerpo', 'estado_http', 'creado'} o None"""
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT html, cuerpo, estado_http, creado FROM respuestas WHERE sitio = ? AND dni = ?",
+                (sitio, dni)
+            ).fetchone()
+        if fila is None:
+            return None
+        html, cuerpo, estado_http, creado = fila
+        return {
+            'html': _descomprimir(html),
+            'cuerpo': _descomprimir(cuerpo),
+            'estado_http': estado_http,
+            'creado': creado,
+        }
+
+    def tiene(self, sitio: str, dni: str) -> bool:
+        with self._lock:
+            return self._conexion.execute(
+                "SELECT 1 FROM respuestas WHERE sitio = ? AND dni = ?", (sitio, dni)
+            ).fetchone() is not None
+
+    def dnis(self, sitio: str) -> List[str]:
+        with self._lock:
+            return [fila[0] for fila in self._conexion.execute(
+                "SELECT dni FROM respuestas WHERE sitio = ? ORDER BY dni", (sitio,)
+            )]
+
+    def contar(self, sitio: Optional[str] = None) -> int:
+        with self._lock:
+            if sitio:
+                return self._conexion.execute("SELECT COUNT(*) FROM respuestas WHERE sitio = ?", (sitio,)).fetchone()[0]
+            return self._conexion.execute("SELECT COUNT(*) FROM respuestas").fetchone()[0]
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.close()
+
+
+_archivo = None
+_lock_configuracion = threading.Lock()
+
+
+def configurar_archivo(ruta, modo: str = 'grabar') -> ArchivoRespuestas:
+    """Activar la grabación o reproducción para el resto del proceso"""
+    global _archivo
+    if _archivo is not None:
+        _archivo.cerrar()
+    _archivo = ArchivoRespuestas(ruta, modo)
+    _archivo.logger.info(f"Archivo de respuestas {_archivo.ruta} en modo {modo} ({_archivo.contar()} respuestas)")
+    return _archivo
+
+
+def valor_sin_resultado(sitio: str, dni: str) -> str:
+    """
+    Valor para la columna de resultado cuando la consulta no dio nada:
+    SIN_GRABACION si se reproduce y el DNI nunca se grabó, NO_ENCONTRADO en otro caso
+    """
+    archivo = obtener_archivo()
+    if archivo is not None and archivo.reproduciendo and not archivo.tiene(sitio, dni):
+        return SIN_GRABACION
+    return 'NO_ENCONTRADO'
+
+
+def obtener_archivo() -> Optional[ArchivoRespuestas]:
+    """
+    Archivo activo del proceso (None = consultas normales sin grabar)
+    Se puede activar con ARCHIVO_RESPUESTAS y ARCHIVO_RESPUESTAS_MODO (grabar por defecto)
+    """
+    if _archivo is None and os.environ.get('ARCHIVO_RESPUESTAS'):
+        with _lock_configuracion:
+            if _archivo is None:
+                configurar_archivo(os.environ['ARCHIVO_RESPUESTAS'],
+                                   os.environ.get('ARCHIVO_RESPUESTAS_MODO', 'grabar'))
+    return _archivo
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Escritor de artefactos de depuración (screenshots y HTML)
+Captura en segundo plano, con muestreo por clase de error y presupuesto de disco
+"""
+
+import os
+import gzip
+import time
+import queue
+import atexit
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+
+
+class ArtefactosDebug:
+    """Guarda screenshots/HTML de fallos sin bloquear el scraper"""
+
+    def __init__(self, directorio: str = "debug_artifacts", primeros: int = 5,
+                 uno_de_cada: int = 50, presupuesto_mb: float = 200, max_pendientes: int = 20):
+        """
+        Args:
+            directorio: Carpeta dedicada para los artefactos
+            primeros: Cantidad de fallos que se capturan siempre por clase de error
+            uno_de_cada: Luego de los primeros, capturar 1 de cada M fallos
+            presupuesto_mb: Tamaño máximo total de la carpeta (se borran los más antiguos)
+            max_pendientes: Capturas en cola antes de descartar nuevas
+        """
+        self.directorio = Path(directorio)
+        self.primeros = primeros
+        self.uno_de_cada = max(uno_de_cada, 1)
+        self.presupuesto = int(presupuesto_mb * 1024 * 1024)
+        self.logger = logging.getLogger(__name__)
+
+        self._contadores = {}
+        self._lock = threading.Lock()
+        self._cola = queue.Queue(maxsize=max_pendientes)
+        self._archivos = deque()
+        self._total_bytes = 0
+        self._indexado = False
+        self._hilo = None
+
+    def debe_capturar(self, clase: str) -> bool:
+        """Decidir si este fallo se captura (primeros N por clase, luego 1 de cada M)"""
+        with self._lock:
+            n = self._contadores.get(clase, 0) + 1
+            self._contadores[clase] = n
+        if n <= self.primeros:
+            return True
+        return (n - self.primeros) % self.uno_de_cada == 0
+
+    def capturar(self, driver, clase: str, dni: str, screenshot: bool = True, html: bool = True) -> bool:
+        """
+        Capturar el estado del navegador para un fallo
+
+        Solo se toman los bytes en el hilo del scraper; la compresión y escritura
+        a disco ocurren en el hilo de fondo.
+        Retorna True si la captura fue encolada
+        """
+        if driver is None or not self.debe_capturar(clase):
+            return False
+
+        png = None
+        page_source = None
+        try:
+            if screenshot:
+                png = driver.get_screenshot_as_png()
+            if html:
+                page_source = driver.page_source
+        except Exception as e:
+            self.logger.debug(f"No se pudo capturar artefacto para DNI {dni}: {e}")
+            if png is None and page_source is None:
+                return False
+
+        self._iniciar_hilo()
+        try:
+            self._cola.put_nowait((clase, dni, png, page_source))
+        except queue.Full:
+            self.logger.debug(f"Cola de artefactos llena, se descarta captura de DNI {dni}")
+            return False
+        return True
+
+    def _iniciar_hilo(self):
+        """Arrancar el hilo escritor la primera vez que se necesita"""
+        if self._hilo is not None:
+            return
+        with self._lock:
+            if self._hilo is not None:
+                return
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            if not self._indexado:
+                self._indexar_existentes()
+                self._indexado = True
+            self._hilo = threading.Thread(target=self._escribir_pendientes, name="artefactos-debug", daemon=True)
+            self._hilo.start()
+
+    def _indexar_existentes(self):
+        """Registrar artefactos de corridas anteriores para respetar el presupuesto"""
+        existentes = sorted(
+            (p for p in self.directorio.iterdir() if p.is_file()),
+            key=lambda p: p.stat().st_mtime
+        )
+        for path in existentes:
+            tamano = path.stat().st_size
+            self._archivos.append((path, tamano))
+            self._total_bytes += tamano
+
+    def _escribir_pendientes(self):
+        """Bucle del hilo de fondo"""
+        while True:
+            item = self._cola.get()
+            try:
+                if item is None:
+                    return
+                self._escribir(*item)
+            except Exception as e:
+                self.logger.debug(f"Error escribiendo artefacto: {e}")
+            finally:
+                self._cola.task_done()
+
+    def _escribir(self, clase: str, dni: str, png, page_source):
+        """Escribir un artefacto comprimido y aplicar el presupuesto de disco"""
+        marca = time.strftime("%Y%m%d_%H%M%S")
+        base = f"{clase}_{dni}_{marca}"
+        anteriores = len(self._archivos)
+
+        if png:
+            # PNG ya está comprimido, se escribe tal cual
+            self._guardar(self.directorio / f"{base}.png", png)
+        if page_source:
+            self._guardar(self.directorio / f"{base}.html.gz",
+                          gzip.compress(page_source.encode("utf-8"), compresslevel=6))
+
+        # Se borran solo artefactos anteriores: la captura recién escrita es la evidencia de este fallo
+        nuevos = len(self._archivos) - anteriores
+        while self._total_bytes > self.presupuesto and len(self._archivos) > nuevos:
+            path, tamano = self._archivos.popleft()
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            self._total_bytes -= tamano
+        if self._total_bytes > self.presupuesto:
+            self.logger.warning(f"El artefacto {base} supera por sí solo el presupuesto de "
+                                f"{self.presupuesto / 2**20:.0f} MB; se conserva igual")
+
+    def _guardar(self, path: Path, datos: bytes):
+        path.write_bytes(datos)
+        self._archivos.append((path, len(datos)))
+        self._total_bytes += len(datos)
+        self.logger.debug(f"Artefacto guardado: {path}")
+
+    def cerrar(self, timeout: float = 10):
+        """Esperar a que se escriban las capturas pendientes y detener el hilo"""
+        if self._hilo is None:
+            return
+        try:
+            self._cola.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._hilo.join(timeout)
+        self._hilo = None
+
+
+_artefactos = None
+
+
+def obtener_artefactos() -> ArtefactosDebug:
+    """
+    Instancia compartida por proceso (los contadores de muestreo sobreviven
+    a los scrapers que se crean por cada DNI).
+    Configurable con variables de entorno DEBUG_ARTIFACTS_*
+    """
+    global _artefactos
+    if _artefactos is None:
+        _artefactos = ArtefactosDebug(
+            directorio=os.environ.get("DEBUG_ARTIFACTS_DIR", "debug_artifacts"),
+            primeros=int(os.environ.get("DEBUG_ARTIFACTS_PRIMEROS", 5)),
+            uno_de_cada=int(os.environ.get("DEBUG_ARTIFACTS_UNO_DE_CADA", 50)),
+            presupuesto_mb=float(os.environ.get("DEBUG_ARTIFACTS_MB", 200)),
+        )
+        atexit.register(_artefactos.cerrar)
+    return _artefactos
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Captura de respuestas XHR desde el log de rendimiento de Chrome (eventos Network de CDP)
+Permite leer la respuesta de la validación apenas llega, sin esperar a que la página la muestre
+"""
+
+import re
+import json
+import time
+import base64
+import logging
+import itertools
+from typing import NamedTuple, Optional
+
+from selenium.common.exceptions import WebDriverException
+
+TIPOS_XHR = {'XHR', 'Fetch'}
+# Solicitudes terminadas que se conservan sin reclamar (XHR ajenos a la consulta)
+MAX_SOLICITUDES = 200
+# Textos de la respuesta que indican DNI o código verificador inválido
+PALABRAS_RECHAZO = (
+    'no valid', 'invalid', 'inválid', 'no existe', 'no coincide', 'incorrect',
+    'no encontrado', 'no se encontr', 'no corresponde',
+)
+CLAVES_EXITO = ('success', 'exito', 'ok', 'valido', 'valid')
+# Claves (sin distinguir mayúsculas) que traen el ubigeo del domicilio; otras como ubigeoNacimiento no cuentan
+CLAVES_UBIGEO = ('ubigeo', 'codubigeo', 'cod_ubigeo', 'codigoubigeo', 'codigo_ubigeo')
+PATRON_UBIGEO = re.compile(r'^\d{6}$')
+CLAVES_MENSAJE = ('message', 'mensaje', 'msg', 'descripcion', 'detail', 'error')
+
+
+class Respuesta(NamedTuple):
+    """Veredicto de la validación: resultado 'ok' (con ubigeo) o 'rechazado' (con el motivo en detalle)"""
+    resultado: str
+    ubigeo: Optional[str]
+    detalle: str
+
+
+class RespuestaCapturada(NamedTuple):
+    """Veredicto junto con la respuesta HTTP original (para grabarla en el archivo de respuestas)"""
+    respuesta: Respuesta
+    estado_http: Optional[int]
+    cuerpo: str
+
+
+def habilitar_log_red(chrome_options):
+    """Pedir a chromedriver los eventos de red en el log 'performance'"""
+    chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+
+def _buscar_ubigeo(datos) -> Optional[str]:
+    """Primer valor con forma de ubigeo (6 dígitos) bajo una de CLAVES_UBIGEO, recorriendo el JSON completo"""
+    pendientes = [datos]
+    while pendientes:
+        actual = pendientes.pop(0)
+        if isinstance(actual, dict):
+            for clave, valor in actual.items():
+                if str(clave).lower() in CLAVES_UBIGEO:
+                    if isinstance(valor, int) and not isinstance(valor, bool):
+                        # Un ubigeo numérico pierde el cero inicial (010101 → 10101)
+                        valor = str(valor).zfill(6)
+                    if isinstance(valor, str) and PATRON_UBIGEO.match(valor.strip()):
+                        return valor.strip()
+                if isinstance(valor, (dict, list)):
+                    pendientes.append(valor)
+        elif isinstance(actual, list):
+            pendientes.extend(actual)
+    return None
+
+
+def _mensaje(datos) -> str:
+    if not isinstance(datos, dict):
+        return ''
+    for clave in CLAVES_MENSAJE:
+        valor = datos.get(clave)
+        if isinstance(valor, str) and valor.strip():
+            return valor.strip()
+        if isinstance(valor, dict):
+            interno = _mensaje(valor)
+            if interno:
+                return interno
+    return ''
+
+
+def _indica_rechazo(datos) -> bool:
+    if not isinstance(datos, dict):
+        return False
+    if any(datos.get(clave) is False for clave in CLAVES_EXITO):
+        return True
+    mensaje = _mensaje(datos).lower()
+    return any(palabra in mensaje for palabra in PALABRAS_RECHAZO)
+
+
+def interpretar_respuesta(estado: Optional[int], cuerpo: str) -> Optional[Respuesta]:
+    """
+    Clasificar la respuesta de la solicitud de validación (ya identificada por el DNI)
+
+    Returns:
+        ('ok', ubigeo, '') si trae ubigeo, ('rechazado', None, motivo) si indica
+        datos inválidos, o None si no es concluyente (otra solicitud, error del servidor)
+    """
+    try:
+        datos = json.loads(cuerpo) if cuerpo else None
+    except ValueError:
+        datos = None
+
+    if datos is not None:
+        ubigeo = _buscar_ubigeo(datos)
+        if ubigeo:
+            return Respuesta('ok', ubigeo, '')
+
+    # Un 4xx es la respuesta a los datos enviados; un 5xx no dice nada sobre el DNI
+    if (estado and 400 <= estado < 500) or _indica_rechazo(datos):
+        return Respuesta('rechazado', None, _mensaje(datos) or f"HTTP {estado}")
+    return None
+
+
+class CapturaRed:
+    """
+    Lector de las solicitudes XHR/Fetch de un driver
+
+    El log de rendimiento se vacía con cada lectura, así que hay una sola
+    CapturaRed por driver; las solicitudes quedan en memoria hasta que se reclaman.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.logger = logging.getLogger(__name__)
+        self.activa = True
+        self._solicitudes = {}
+        self._orden = itertools.count()
+
+    def _leer_log(self):
+        try:
+            entradas = self.driver.get_log('performance')
+        except WebDriverException as e:
+            # Driver sin goog:loggingPrefs: se usan solo los selectores
+            self.logger.warning(f"Log de red no disponible, se leerá el ubigeo de la página: {e}")
+            self.activa = False
+            return
+
+        for entrada in entradas:
+            try:
+                mensaje = json.loads(entrada['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            metodo = mensaje.get('method', '')
+            params = mensaje.get('params', {})
+            id_solicitud = params.get('requestId')
+
+            if metodo == 'Network.requestWillBeSent' and params.get('type') in TIPOS_XHR:
+                solicitud = params.get('request', {})
+                self._solicitudes[id_solicitud] = {
+                    'orden': next(self._orden),
+                    'url': solicitud.get('url', ''),
+                    'datos': solicitud.get('postData', ''),
+                    'estado': None,
+                    'terminada': False,
+                    'fallo': None,
+                }
+                continue
+
+            solicitud = self._solicitudes.get(id_solicitud)
+            if solicitud is None:
+                continue
+            if metodo == 'Network.responseReceived':
+                solicitud['estado'] = params.get('response', {}).get('status')
+            elif metodo == 'Network.loadingFinished':
+                solicitud['terminada'] = True
+            elif metodo == 'Network.loadingFailed':
+                solicitud['terminada'] = True
+                solicitud['fallo'] = params.get('errorText') or 'error de red'
+
+        if len(self._solicitudes) > MAX_SOLICITUDES:
+            antiguas = sorted(self._solicitudes, key=lambda rid: self._solicitudes[rid]['orden'])
+            for id_solicitud in antiguas[:len(self._solicitudes) - MAX_SOLICITUDES]:
+                del self._solicitudes[id_solicitud]
+
+    def _cuerpo(self, id_solicitud: str) -> str:
+        respuesta = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': id_solicitud})
+        cuerpo = respuesta.get('body', '')
+        if respuesta.get('base64Encoded'):
+            cuerpo = base64.b64decode(cuerpo).decode('utf-8', 'replace')
+        return cuerpo
+
+    def descartar(self):
+        """Olvidar el tráfico anterior (llamar justo antes de enviar el formulario)"""
+        self._leer_log()
+        self._solicitudes.clear()
+
+    def buscar(self, dni: str) -> Optional[RespuestaCapturada]:
+        """
+        Revisar sin bloquear las respuestas ya recibidas
+
+        Args:
+            dni: Solo se consideran solicitudes cuya URL o cuerpo contiene este DNI: separa la validación
+                 de otros XHR de la página (analítica, catálogos, un 401/404 ajeno) y de las otras pestañas
+        """
+        if not self.activa:
+            return None
+        self._leer_log()
+
+        terminadas = sorted(
+            (solicitud['orden'], id_solicitud) for id_solicitud, solicitud in self._solicitudes.items()
+            if solicitud['terminada']
+        )
+        for _, id_solicitud in terminadas:
+            solicitud = self._solicitudes[id_solicitud]
+            if dni not in solicitud['url'] + solicitud['datos']:
+                continue
+            if solicitud['fallo']:
+                self.logger.warning(f"Solicitud fallida {solicitud['url']}: {solicitud['fallo']}")
+                del self._solicitudes[id_solicitud]
+                continue
+            try:
+                cuerpo = self._cuerpo(id_solicitud)
+            except WebDriverException:
+                # Respuesta de otra pestaña o ya descartada por Chrome
+                continue
+            del self._solicitudes[id_solicitud]
+
+            respuesta = interpretar_respuesta(solicitud['estado'], cuerpo)
+            if respuesta:
+                return RespuestaCapturada(respuesta, solicitud['estado'], cuerpo)
+        return None
+
+    def esperar(self, timeout: float, dni: str, intervalo: float = 0.05) -> Optional[RespuestaCapturada]:
+        """Bloquear hasta una respuesta concluyente o hasta agotar el tiempo (None)"""
+        limite = time.monotonic() + timeout
+        while self.activa and time.monotonic() < limite:
+            respuesta = self.buscar(dni)
+            if respuesta:
+                return respuesta
+            time.sleep(intervalo)
+        return None
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Configuración de logging no bloqueante y estructurada
+Un solo QueueListener por proceso escribe registros JSON a archivo y consola
+"""
+
+import os
+import sys
+import json
+import zlib
+import queue
+import atexit
+import logging
+import logging.handlers
+
+# Atributos propios de LogRecord; todo lo demás viene de `extra=`
+_ATRIBUTOS_ESTANDAR = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por registro con los campos estructurados (dni, stage, duration, outcome...)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        datos = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_ESTANDAR and not clave.startswith("_"):
+                datos[clave] = valor
+        if record.exc_info:
+            datos["exc"] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+class MuestreoPorDNI(logging.Filter):
+    """
+    Muestrear los mensajes por paso (registros con `stage` y sin `outcome`)
+
+    La decisión es determinística por DNI: se conservan todos los pasos de un DNI
+    o ninguno. Advertencias, errores y resultados finales pasan siempre.
+    """
+
+    def __init__(self, tasa: float = 1.0):
+        super().__init__()
+        self.umbral = int(max(0.0, min(tasa, 1.0)) * 10000)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.umbral >= 10000:
+            return True
+        if not hasattr(record, "stage") or hasattr(record, "outcome"):
+            return True
+        dni = str(getattr(record, "dni", ""))
+        return zlib.crc32(dni.encode()) % 10000 < self.umbral
+
+
+def configurar_logging(archivo_log: str = None, nivel: int = logging.INFO, muestreo: float = None,
+                       formato_consola: str = None) -> logging.Logger:
+    """
+    Configurar logging una sola vez por proceso (las llamadas siguientes no hacen nada)
+
+    Args:
+        archivo_log: Archivo donde escribir los registros JSON (None = solo consola)
+        nivel: Nivel mínimo de logging
+        muestreo: Fracción de DNIs cuyos mensajes por paso se registran
+                  (default: variable LOG_MUESTREO o 0.1)
+        formato_consola: 'json' o 'texto' (default: variable LOG_FORMATO_CONSOLA o 'json')
+    """
+    global _listener
+    raiz = logging.getLogger()
+    if _listener is not None:
+        return raiz
+
+    if muestreo is None:
+        muestreo = float(os.environ.get("LOG_MUESTREO", 0.1))
+    if formato_consola is None:
+        formato_consola = os.environ.get("LOG_FORMATO_CONSOLA", "json")
+
+    formato_json = FormatoJSON()
+    consola = logging.StreamHandler(sys.stdout)
+    if formato_consola == "texto":
+        consola.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    else:
+        consola.setFormatter(formato_json)
+    destinos = [consola]
+
+    if archivo_log:
+        archivo = logging.FileHandler(archivo_log, encoding='utf-8')
+        archivo.setFormatter(formato_json)
+        destinos.append(archivo)
+
+    # El hilo que scrapea solo encola; el formateo y la E/S ocurren en el listener
+    cola = queue.SimpleQueue()
+    encolador = logging.handlers.QueueHandler(cola)
+    encolador.addFilter(MuestreoPorDNI(muestreo))
+
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    raiz.addHandler(encolador)
+    raiz.setLevel(nivel)
+
+    _listener = logging.handlers.QueueListener(cola, *destinos, respect_handler_level=True)
+    _listener.start()
+    atexit.register(detener_logging)
+    return raiz
+
+
+def detener_logging():
+    """Vaciar la cola y detener el listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -10,27 +10,73 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.common.exceptions import TimeoutException
 import time
 import logging
-from typing import Optional, Tuple
+from typing import Iterable, Iterator, Optional, Tuple
 import re
+from artefactos_debug import obtener_artefactos
+from configuracion_logs import configurar_logging
+from driver_chrome import ruta_chromedriver
+from perfilador import obtener_perfilador
+from gobernador import NavegadorGobernado, marcar_navegador, obtener_gobernador
+from pestanas import PipelinePestanas, Esperar, Pausa, SCRIPT_NAVEGAR, pagina_nueva, verificar_recargas
+from captura_red import CapturaRed, RespuestaCapturada, habilitar_log_red, interpretar_respuesta
+from archivo_respuestas import SITIO_CONGRESO, obtener_archivo, html_con_valores
 
-class CongresoScraper:
+# Selectores del formulario de registro
+XPATH_DROPDOWN = "/html/body/app-root/app-register-form/div/section/form/div/div/div[2]/div/div/div/p-fieldset[1]/fieldset/div/div/div[1]/div[2]/div/p-dropdown/div/span"
+XPATH_OPCION_DNI = "/html/body/app-root/app-register-form/div/section/form/div/div/div[2]/div/div/div/p-fieldset[1]/fieldset/div/div/div[1]/div[2]/div/p-dropdown/div/div[3]/div/ul/p-dropdownitem[1]/li/span"
+XPATH_VALIDAR = "/html/body/app-root/app-register-form/div/section/form/div/div/div[2]/div/div/div/p-fieldset[1]/fieldset/div/div/div[2]/div[3]/div[1]/button"
+SELECTORES_UBIGEO = [
+    "//*[@id='ubigeo']",
+    "//input[@id='ubigeo']",
+    "//input[contains(@placeholder, 'ubigeo')]"
+]
+
+def extraer_ubigeo_html(html: str) -> Optional[str]:
+    """Ubigeo de una página grabada (mismos campos que SELECTORES_UBIGEO)"""
+    from bs4 import BeautifulSoup
+    
+    sopa = BeautifulSoup(html, 'html.parser')
+    campos = [sopa.find(id='ubigeo')] + sopa.find_all(
+        'input', placeholder=lambda placeholder: placeholder and 'ubigeo' in placeholder
+    )
+    for campo in campos:
+        if campo is None:
+            continue
+        ubigeo = (campo.get('value') or campo.get_text()).strip()
+        if ubigeo:
+            return ubigeo
+    return None
+
+class CongresoScraper(NavegadorGobernado):
     """Web scraper para obtener ubigeo desde el portal del Congreso"""
     
     def __init__(self, headless: bool = True, delay: int = 2):
         self.url = "https://wb2server.congreso.gob.pe/mpv/#/registro"
         self.delay = delay
+        self.artefactos = obtener_artefactos()
+        self.perfilador = obtener_perfilador()
+        self.gobernador = obtener_gobernador()
+        self.headless = headless
+        self._consultas = 0
+        self.archivo = obtener_archivo()
         self.setup_logging()
-        self.driver = self.setup_driver(headless)
+        self.driver = None
+        if self.reproduciendo:
+            # En reproducción no se abre Chrome ni se espera entre consultas
+            self.delay = 0
+        else:
+            self._abrir_driver()
+    
+    @property
+    def reproduciendo(self) -> bool:
+        return self.archivo is not None and self.archivo.reproduciendo
     
     def setup_logging(self):
-        """Configurar logging"""
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
+        """Configurar logging (una sola vez por proceso)"""
+        configurar_logging()
         self.logger = logging.getLogger(__name__)
     
     def setup_driver(self, headless: bool = True):
@@ -49,13 +95,20 @@ class CongresoScraper:
         chrome_options.add_argument("--no-sandbox")
         chrome_options.add_argument("--disable-dev-shm-usage")
         chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+        # iter_ubigeos reparte las consultas en pestañas: ninguna debe quedar suspendida en segundo plano
+        chrome_options.add_argument("--disable-background-timer-throttling")
+        chrome_options.add_argument("--disable-renderer-backgrounding")
+        chrome_options.add_argument("--disable-backgrounding-occluded-windows")
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option('useAutomationExtension', False)
+        marcar_navegador(chrome_options)
+        # Eventos de red para leer la respuesta de la validación (captura_red)
+        habilitar_log_red(chrome_options)
         
         # User agent para parecer más humano
         chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
         
-        service = Service(ChromeDriverManager().install())
+        service = Service(ruta_chromedriver())
         driver = webdriver.Chrome(service=service, options=chrome_options)
         
         # Ejecutar script para ocultar webdriver
@@ -75,129 +128,326 @@ class CongresoScraper:
         Returns:
             String con el ubigeo o None si hay error
         """
+        if self.reproduciendo:
+            with self.perfilador.span("get_ubigeo", dni, categoria="dni"):
+                return self._reproducir(dni)
+        
+        with self.perfilador.span("get_ubigeo", dni, categoria="dni"):
+            try:
+                self._revisar_recursos()
+            except Exception as e:
+                # Chrome no se pudo abrir: cuenta como error y se reintenta con la próxima consulta
+                return self._registrar_error(dni, e, time.perf_counter())
+            return self._get_ubigeo(dni, codigo_verificador)
+    
+    def _reproducir(self, dni: str) -> Optional[str]:
+        """Extraer el ubigeo de la respuesta grabada (XHR de validación o página) sin abrir el portal"""
+        inicio = time.perf_counter()
+        registro = self.archivo.leer(SITIO_CONGRESO, dni)
+        if registro is None:
+            self.logger.warning(f"DNI {dni} no está en el archivo de respuestas",
+                                extra={'dni': dni, 'stage': 'resultado', 'outcome': 'sin_grabacion'})
+            return None
+        
+        if registro['cuerpo']:
+            respuesta = interpretar_respuesta(registro['estado_http'], registro['cuerpo'])
+            if respuesta and respuesta.resultado == 'rechazado':
+                return self._registrar_rechazo(dni, respuesta.detalle, inicio)
+            if respuesta:
+                return self._registrar_resultado(dni, respuesta.ubigeo, inicio)
+        
+        ubigeo = extraer_ubigeo_html(registro['html']) if registro['html'] else None
+        return self._registrar_resultado(dni, ubigeo, inicio)
+    
+    def _grabar(self, dni: str, captura: Optional[RespuestaCapturada] = None):
+        """Guardar la página y la respuesta XHR de la validación (modo grabación)"""
+        if not (self.archivo and self.archivo.grabando and self.driver):
+            return
         try:
-            self.logger.info(f"Procesando DNI: {dni} con código: {codigo_verificador}")
+            self.archivo.guardar(SITIO_CONGRESO, dni, html=html_con_valores(self.driver),
+                                 cuerpo=captura.cuerpo if captura else None,
+                                 estado_http=captura.estado_http if captura else None)
+        except Exception as e:
+            self.logger.warning(f"No se pudo grabar la respuesta del DNI {dni}: {e}",
+                                extra={'dni': dni, 'stage': 'grabar'})
+    
+    def _get_ubigeo(self, dni: str, codigo_verificador: str) -> Optional[str]:
+        """Consulta de un DNI con un span por cada paso"""
+        span = self.perfilador.span
+        inicio = time.perf_counter()
+        try:
+            self.logger.info(f"Procesando DNI: {dni} con código: {codigo_verificador}",
+                             extra={'dni': dni, 'stage': 'inicio'})
             
             # REINICIAR COMPLETAMENTE PARA CADA REQUEST
-            self.driver.delete_all_cookies()
+            with span("limpiar_cookies", dni):
+                self.driver.delete_all_cookies()
             
             # Navegar a la página limpia
-            self.driver.get(self.url)
-            time.sleep(self.delay * 2)
+            with span("navegar", dni):
+                self.driver.get(self.url)
+            with span("pausa_carga", dni, categoria="sleep"):
+                time.sleep(self.delay * 2)
             
             # Esperar a que cargue completamente
-            WebDriverWait(self.driver, 20).until(
-                lambda driver: driver.execute_script("return document.readyState") == "complete"
-            )
+            with span("esperar_ready_state", dni):
+                WebDriverWait(self.driver, 20).until(
+                    lambda driver: driver.execute_script("return document.readyState") == "complete"
+                )
             
             # Esperar a que aparezcan los elementos principales
-            WebDriverWait(self.driver, 15).until(
-                EC.presence_of_element_located((By.XPATH, "//p-dropdown[@id='tipoDocumento']"))
-            )
-            time.sleep(2)
+            with span("esperar_angular", dni):
+                WebDriverWait(self.driver, 15).until(
+                    EC.presence_of_element_located((By.XPATH, "//p-dropdown[@id='tipoDocumento']"))
+                )
+            with span("pausa_angular", dni, categoria="sleep"):
+                time.sleep(2)
             
             # 1. Localizar y hacer clic en el dropdown
-            dropdown = WebDriverWait(self.driver, 15).until(
-                EC.element_to_be_clickable((By.XPATH, "/html/body/app-root/app-register-form/div/section/form/div/div/div[2]/div/div/div/p-fieldset[1]/fieldset/div/div/div[1]/div[2]/div/p-dropdown/div/span"))
-            )
-            
-            # Hacer scroll al elemento y click
-            self.driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", dropdown)
-            time.sleep(1)
-            self.driver.execute_script("arguments[0].click();", dropdown)
-            time.sleep(2)
+            with span("abrir_dropdown", dni):
+                dropdown = WebDriverWait(self.driver, 15).until(
+                    EC.element_to_be_clickable((By.XPATH, XPATH_DROPDOWN))
+                )
+                
+                # Hacer scroll al elemento y click
+                self.driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", dropdown)
+            with span("pausa_scroll_dropdown", dni, categoria="sleep"):
+                time.sleep(1)
+            with span("click_dropdown", dni):
+                self.driver.execute_script("arguments[0].click();", dropdown)
+            with span("pausa_dropdown", dni, categoria="sleep"):
+                time.sleep(2)
             
             # 2. Seleccionar "Documento Nacional de Identidad"
-            dni_option = WebDriverWait(self.driver, 10).until(
-                EC.element_to_be_clickable((By.XPATH, "/html/body/app-root/app-register-form/div/section/form/div/div/div[2]/div/div/div/p-fieldset[1]/fieldset/div/div/div[1]/div[2]/div/p-dropdown/div/div[3]/div/ul/p-dropdownitem[1]/li/span"))
-            )
-            self.driver.execute_script("arguments[0].click();", dni_option)
-            time.sleep(2)
+            with span("seleccionar_dni", dni):
+                dni_option = WebDriverWait(self.driver, 10).until(
+                    EC.element_to_be_clickable((By.XPATH, XPATH_OPCION_DNI))
+                )
+                self.driver.execute_script("arguments[0].click();", dni_option)
+            with span("pausa_opcion", dni, categoria="sleep"):
+                time.sleep(2)
             
             # 3. Ingresar número de documento (DNI)
-            doc_input = WebDriverWait(self.driver, 10).until(
-                EC.element_to_be_clickable((By.XPATH, "//*[@id='tmp_nrodocumento']"))
-            )
-            self.driver.execute_script("arguments[0].scrollIntoView(true);", doc_input)
-            self.driver.execute_script("arguments[0].value = '';", doc_input)  # Limpiar con JS
-            doc_input.click()
-            doc_input.send_keys(dni)
-            time.sleep(1)
+            with span("escribir_dni", dni):
+                doc_input = WebDriverWait(self.driver, 10).until(
+                    EC.element_to_be_clickable((By.XPATH, "//*[@id='tmp_nrodocumento']"))
+                )
+                self.driver.execute_script("arguments[0].scrollIntoView(true);", doc_input)
+                self.driver.execute_script("arguments[0].value = '';", doc_input)  # Limpiar con JS
+                doc_input.click()
+                doc_input.send_keys(dni)
+            with span("pausa_dni", dni, categoria="sleep"):
+                time.sleep(1)
             
             # 4. Ingresar código verificador
-            verificador_input = WebDriverWait(self.driver, 10).until(
-                EC.element_to_be_clickable((By.XPATH, "//*[@id='tmp_verificador']"))
-            )
-            self.driver.execute_script("arguments[0].value = '';", verificador_input)  # Limpiar con JS
-            verificador_input.click()
-            verificador_input.send_keys(codigo_verificador)
-            time.sleep(1)
+            with span("escribir_verificador", dni):
+                verificador_input = WebDriverWait(self.driver, 10).until(
+                    EC.element_to_be_clickable((By.XPATH, "//*[@id='tmp_verificador']"))
+                )
+                self.driver.execute_script("arguments[0].value = '';", verificador_input)  # Limpiar con JS
+                verificador_input.click()
+                verificador_input.send_keys(codigo_verificador)
+            with span("pausa_verificador", dni, categoria="sleep"):
+                time.sleep(1)
             
             # 5. Hacer clic en el botón "Validar"
-            validar_btn = WebDriverWait(self.driver, 10).until(
-                EC.element_to_be_clickable((By.XPATH, "/html/body/app-root/app-register-form/div/section/form/div/div/div[2]/div/div/div/p-fieldset[1]/fieldset/div/div/div[2]/div[3]/div[1]/button"))
-            )
-            self.driver.execute_script("arguments[0].scrollIntoView(true);", validar_btn)
-            time.sleep(1)
-            self.driver.execute_script("arguments[0].click();", validar_btn)
-            
-            # 6. Esperar y obtener el ubigeo
-            time.sleep(self.delay * 3)  # Más tiempo para procesar
+            with span("buscar_validar", dni):
+                validar_btn = WebDriverWait(self.driver, 10).until(
+                    EC.element_to_be_clickable((By.XPATH, XPATH_VALIDAR))
+                )
+                self.driver.execute_script("arguments[0].scrollIntoView(true);", validar_btn)
+            with span("pausa_scroll_validar", dni, categoria="sleep"):
+                time.sleep(1)
+            with span("click_validar", dni):
+                # Solo interesa el tráfico que genera la validación
+                self.red.descartar()
+                self.driver.execute_script("arguments[0].click();", validar_btn)
             
-            # Intentar múltiples formas de obtener el ubigeo
-            ubigeo = None
-            selectors_ubigeo = [
-                "//*[@id='ubigeo']",
-                "//input[@id='ubigeo']",
-                "//input[contains(@placeholder, 'ubigeo')]"
-            ]
+            # 6. Leer la respuesta de la validación apenas llega
+            with span("esperar_respuesta", dni):
+                captura = self.red.esperar(timeout=self.delay * 3 + 10, dni=dni)
+            if captura and captura.respuesta.resultado == 'rechazado':
+                return self._registrar_rechazo(dni, captura.respuesta.detalle, inicio, captura)
+            ubigeo = captura.respuesta.ubigeo if captura else None
             
-            for selector in selectors_ubigeo:
-                try:
-                    ubigeo_field = WebDriverWait(self.driver, 10).until(
-                        EC.presence_of_element_located((By.XPATH, selector))
-                    )
-                    
-                    ubigeo = ubigeo_field.get_attribute("value")
-                    if not ubigeo:
-                        ubigeo = ubigeo_field.text.strip()
-                    
-                    if ubigeo:
-                        break
-                except:
-                    continue
+            # Sin respuesta reconocible en la red: leer el campo de la página
+            if not ubigeo:
+                with span("leer_ubigeo", dni):
+                    try:
+                        ubigeo = WebDriverWait(self.driver, self._espera_pagina()).until(self._leer_ubigeo_visible)
+                    except TimeoutException:
+                        ubigeo = None
             
-            if ubigeo:
-                self.logger.info(f"Ubigeo encontrado para DNI {dni}: {ubigeo}")
-                return ubigeo
-            else:
-                self.logger.warning(f"No se encontró ubigeo para DNI {dni}")
-                return None
+            return self._registrar_resultado(dni, ubigeo, inicio, captura)
                 
         except Exception as e:
-            self.logger.error(f"Error procesando DNI {dni}: {e}")
-            
-            # Hacer screenshot para depuración
+            return self._registrar_error(dni, e, inicio)
+    
+    def _registrar_resultado(self, dni: str, ubigeo: Optional[str], inicio: float,
+                             captura: Optional[RespuestaCapturada] = None) -> Optional[str]:
+        self._grabar(dni, captura)
+        if ubigeo:
+            self.logger.info(f"Ubigeo encontrado para DNI {dni}: {ubigeo}",
+                             extra={'dni': dni, 'stage': 'resultado', 'outcome': 'ok',
+                                    'duration': round(time.perf_counter() - inicio, 3)})
+            return ubigeo
+        
+        self.logger.warning(f"No se encontró ubigeo para DNI {dni}",
+                            extra={'dni': dni, 'stage': 'resultado', 'outcome': 'no_encontrado',
+                                   'duration': round(time.perf_counter() - inicio, 3)})
+        return None
+    
+    def _registrar_rechazo(self, dni: str, motivo: str, inicio: float,
+                           captura: Optional[RespuestaCapturada] = None) -> None:
+        self._grabar(dni, captura)
+        self.logger.warning(f"Validación rechazada para DNI {dni}: {motivo}",
+                            extra={'dni': dni, 'stage': 'resultado', 'outcome': 'rechazado',
+                                   'duration': round(time.perf_counter() - inicio, 3)})
+        return None
+    
+    def _espera_pagina(self) -> float:
+        """Segundos para buscar el ubigeo en la página: breve si la red ya se revisó"""
+        return 5 if self.red.activa else self.delay * 3 + 10
+    
+    def _registrar_error(self, dni: str, e: Exception, inicio: float) -> None:
+        # Se graba igual: con la página del fallo se puede volver a extraer sin consultar al Congreso
+        self._grabar(dni)
+        self.logger.error(f"Error procesando DNI {dni}: {e}",
+                          extra={'dni': dni, 'stage': 'resultado', 'outcome': 'error',
+                                 'duration': round(time.perf_counter() - inicio, 3)})
+        
+        # Screenshot para depuración (muestreado, se escribe en segundo plano)
+        self.artefactos.capturar(self.driver, f"congreso_{type(e).__name__}", dni, html=False)
+        return None
+    
+    def _leer_ubigeo_visible(self, driver) -> Optional[str]:
+        """Condición no bloqueante: valor del campo ubigeo si ya está en la página"""
+        for selector in SELECTORES_UBIGEO:
+            for campo in driver.find_elements(By.XPATH, selector):
+                ubigeo = campo.get_attribute("value") or campo.text.strip()
+                if ubigeo:
+                    return ubigeo
+        return None
+    
+    def _pasos_ubigeo(self, dni: str, codigo_verificador: str):
+        """
+        La misma consulta que get_ubigeo como tarea de PipelinePestanas
+        
+        No se borran las cookies: el navegador es compartido por todas las pestañas.
+        Los spans abarcan los yield, así que incluyen el tiempo en que avanzan otras pestañas
+        """
+        span = self.perfilador.span
+        with span("get_ubigeo", dni, categoria="dni"):
+            inicio = time.perf_counter()
             try:
-                screenshot_path = f"debug_congreso_{dni}.png"
-                self.driver.save_screenshot(screenshot_path)
-                self.logger.debug(f"Screenshot guardado: {screenshot_path}")
-            except:
-                pass
+                self.logger.info(f"Procesando DNI: {dni} con código: {codigo_verificador}",
+                                 extra={'dni': dni, 'stage': 'inicio'})
                 
-            return None
-    
-    def close(self):
-        """Cerrar el driver"""
-        if self.driver:
-            self.driver.quit()
-            self.logger.info("Driver cerrado")
+                with span("navegar", dni):
+                    self.driver.execute_script(SCRIPT_NAVEGAR, self.url)
+                    yield Esperar(pagina_nueva, timeout=30, nombre="carga de página")
+                with span("pausa_carga", dni, categoria="sleep"):
+                    yield Pausa(self.delay * 2)
+                
+                with span("esperar_angular", dni):
+                    yield Esperar(EC.presence_of_element_located((By.XPATH, "//p-dropdown[@id='tipoDocumento']")),
+                                  timeout=15, nombre="formulario Angular")
+                with span("pausa_angular", dni, categoria="sleep"):
+                    yield Pausa(2)
+                
+                # 1. Dropdown de tipo de documento
+                with span("abrir_dropdown", dni):
+                    dropdown = yield Esperar(EC.element_to_be_clickable((By.XPATH, XPATH_DROPDOWN)),
+                                             timeout=15, nombre="dropdown")
+                    self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", dropdown)
+                    self.driver.execute_script("arguments[0].click();", dropdown)
+                with span("pausa_dropdown", dni, categoria="sleep"):
+                    yield Pausa(2)
+                
+                # 2. "Documento Nacional de Identidad"
+                with span("seleccionar_dni", dni):
+                    dni_option = yield Esperar(EC.element_to_be_clickable((By.XPATH, XPATH_OPCION_DNI)),
+                                               nombre="opción DNI")
+                    self.driver.execute_script("arguments[0].click();", dni_option)
+                with span("pausa_opcion", dni, categoria="sleep"):
+                    yield Pausa(2)
+                
+                # 3. Número de documento
+                with span("escribir_dni", dni):
+                    doc_input = yield Esperar(EC.element_to_be_clickable((By.XPATH, "//*[@id='tmp_nrodocumento']")),
+                                              nombre="input DNI")
+                    self.driver.execute_script("arguments[0].scrollIntoView(true);", doc_input)
+                    self.driver.execute_script("arguments[0].value = '';", doc_input)
+                    doc_input.click()
+                    doc_input.send_keys(dni)
+                with span("pausa_dni", dni, categoria="sleep"):
+                    yield Pausa(1)
+                
+                # 4. Código verificador
+                with span("escribir_verificador", dni):
+                    verificador_input = yield Esperar(EC.element_to_be_clickable((By.XPATH, "//*[@id='tmp_verificador']")),
+                                                      nombre="input verificador")
+                    self.driver.execute_script("arguments[0].value = '';", verificador_input)
+                    verificador_input.click()
+                    verificador_input.send_keys(codigo_verificador)
+                with span("pausa_verificador", dni, categoria="sleep"):
+                    yield Pausa(1)
+                
+                # 5. "Validar"
+                with span("click_validar", dni):
+                    validar_btn = yield Esperar(EC.element_to_be_clickable((By.XPATH, XPATH_VALIDAR)),
+                                                nombre="botón validar")
+                    self.driver.execute_script("arguments[0].scrollIntoView(true);", validar_btn)
+                    self.driver.execute_script("arguments[0].click();", validar_btn)
+                
+                # 6. Respuesta de la validación en la red (solo cuenta la solicitud con este DNI)
+                captura = None
+                if self.red.activa:
+                    with span("esperar_respuesta", dni):
+                        try:
+                            captura = yield Esperar(lambda driver: self.red.buscar(dni),
+                                                    timeout=self.delay * 3 + 10, nombre="respuesta de validación")
+                        except TimeoutException:
+                            captura = None
+                if captura and captura.respuesta.resultado == 'rechazado':
+                    return self._registrar_rechazo(dni, captura.respuesta.detalle, inicio, captura)
+                ubigeo = captura.respuesta.ubigeo if captura else None
+                
+                # Sin respuesta reconocible: se reanuda apenas el campo de la página tiene valor
+                if not ubigeo:
+                    with span("leer_ubigeo", dni):
+                        try:
+                            ubigeo = yield Esperar(self._leer_ubigeo_visible, timeout=self._espera_pagina(), nombre="ubigeo")
+                        except TimeoutException:
+                            ubigeo = None
+                
+                return self._registrar_resultado(dni, ubigeo, inicio, captura)
+            
+            except Exception as e:
+                return self._registrar_error(dni, e, inicio)
     
-    def __enter__(self):
-        return self
+    def iter_ubigeos(self, consultas: Iterable[Tuple[str, str]], pestanas: int = 3) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Consultar varios (dni, codigo_verificador) con varias pestañas del mismo Chrome
+        Entrega (dni, ubigeo) en orden de finalización
+        """
+        if self.reproduciendo:
+            for dni, codigo in consultas:
+                yield dni, self.get_ubigeo(dni, codigo)
+            return
+        
+        if self.driver is None:
+            self._abrir_driver()
+        pipeline = PipelinePestanas(self.driver, pestanas=pestanas)
+        tareas = (
+            (dni, lambda dni=dni, codigo=codigo: self._pasos_ubigeo(dni, codigo))
+            for dni, codigo in consultas
+        )
+        yield from pipeline.ejecutar(tareas)
     
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
+    def _driver_abierto(self):
+        # El log de red es por driver: se renueva con cada navegador
+        self.red = CapturaRed(self.driver)
 
 def test_congreso_scraper():
     """Función de prueba"""
@@ -211,5 +461,19 @@ def test_congreso_scraper():
         print(f"Código: {codigo_prueba}")
         print(f"Ubigeo: {ubigeo}")
 
+def test_consultas_misma_pestana():
+    """Dos consultas seguidas en una sola pestaña (la ruta #/registro debe recargar también la segunda vez)"""
+    dni_prueba = "73515183"
+    codigo_prueba = "1"
+    
+    with CongresoScraper(headless=True, delay=1) as scraper:
+        recarga = verificar_recargas(scraper.driver, scraper.url, veces=2)
+        print(f"Recarga en navegaciones consecutivas: {'OK' if recarga else 'FALLA'}")
+        resultados = list(scraper.iter_ubigeos([(dni_prueba, codigo_prueba)] * 2, pestanas=1))
+        for dni, ubigeo in resultados:
+            print(f"DNI: {dni} -> Ubigeo: {ubigeo}")
+        print(f"Segunda consulta igual a la primera: {'OK' if resultados[0][1] == resultados[1][1] else 'FALLA'}")
+
 if __name__ == "__main__":
-    test_congreso_scraper()
\ No newline at end of file
+    test_congreso_scraper()
+    test_consultas_misma_pestana()
\ No newline at end of file
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Preparación común de las corridas de procesar_csv.py y procesar_ubigeos.py
+Opciones --grabar/--reproducir/--plan/--plazo, archivo de respuestas y registro en el historial del estimador
+"""
+
+import time
+from typing import Optional
+
+from perfilador import activar_perfilador, obtener_perfilador
+from gobernador import obtener_gobernador
+from archivo_respuestas import configurar_archivo
+from estimador import registrar_corrida
+
+
+def agregar_opciones(parser):
+    """Agregar al parser las opciones del archivo de respuestas y del plan"""
+    grupo_archivo = parser.add_mutually_exclusive_group()
+    grupo_archivo.add_argument('--grabar', metavar='ARCHIVO', help='Grabar las respuestas de cada DNI en un archivo SQLite')
+    grupo_archivo.add_argument('--reproducir', metavar='ARCHIVO', help='Extraer desde un archivo grabado, sin consultar los sitios')
+    parser.add_argument('--plan', action='store_true', help='Solo contar los DNIs a consultar y estimar la duración (no abre Chrome)')
+    parser.add_argument('--plazo', type=float, metavar='HORAS', help='Con --plan: recomendar delay y pestañas para terminar en este plazo')
+
+
+class Corrida:
+    """
+    Estado compartido de una corrida de una fase ('codigos' o 'ubigeos')
+
+    Uso:
+        corrida = Corrida('codigos', delay, pestanas, perfil, grabar, reproducir)
+        if not corrida.preparar(logger): return
+        corrida.iniciar_consultas()
+        ...
+        corrida.registrar(consultas)
+    """
+
+    def __init__(self, fase: str, delay: float, pestanas: int = 1, perfil: Optional[str] = None,
+                 grabar: Optional[str] = None, reproducir: Optional[str] = None):
+        self.fase = fase
+        self.delay = delay
+        self.pestanas = pestanas
+        self.grabar = grabar
+        self.reproducir = reproducir
+        self.perfilador = activar_perfilador() if perfil else obtener_perfilador()
+        self._inicio = None
+
+    def preparar(self, logger) -> bool:
+        """Eliminar Chrome huérfanos y abrir el archivo de respuestas; False si no se pudo abrir"""
+        # Restos de corridas anteriores que murieron sin cerrar Chrome
+        obtener_gobernador().limpiar_huerfanos()
+        try:
+            if self.grabar:
+                configurar_archivo(self.grabar, 'grabar')
+            elif self.reproducir:
+                configurar_archivo(self.reproducir, 'reproducir')
+                self.delay = 0
+        except (OSError, ValueError) as e:
+            logger.error(f"No se pudo abrir el archivo de respuestas: {e}")
+            return False
+        return True
+
+    def iniciar_consultas(self):
+        self._inicio = time.time()
+
+    def registrar(self, consultas: int):
+        """Guardar la duración en el historial para estimar las próximas corridas (las reproducciones no miden los sitios)"""
+        if self.reproducir or self._inicio is None:
+            return
+        registrar_corrida(self.fase, consultas, time.time() - self._inicio, self.delay, self.pestanas, self.perfilador)
@@ -4,27 +4,71 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
 import time
 import logging
-from typing import Optional, Tuple
+from typing import Iterable, Iterator, Optional, Tuple
 import re
+from artefactos_debug import obtener_artefactos
+from configuracion_logs import configurar_logging
+from driver_chrome import ruta_chromedriver
+from perfilador import obtener_perfilador
+from gobernador import NavegadorGobernado, marcar_navegador, obtener_gobernador
+from archivo_respuestas import SITIO_ELDNI, obtener_archivo, html_con_valores
+from resultados import AlmacenResultados
+from pestanas import PipelinePestanas, Esperar, Pausa, SCRIPT_NAVEGAR, pagina_nueva
 
-class DNIScraper:
+def extraer_resultado_html(html: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    Extraer (codigo_verificador, departamento, provincia) de una página de resultado grabada
+    Mismos selectores que la consulta en vivo
+    """
+    from bs4 import BeautifulSoup
+    
+    sopa = BeautifulSoup(html, 'html.parser')
+    codigo_verificador = None
+    campo = sopa.find(id='digito_verificador')
+    if campo is not None:
+        codigo_verificador = (campo.get('value') or campo.get_text()).strip() or None
+    
+    departamento = None
+    provincia = None
+    for bloque in sopa.find_all('div', class_=lambda clase: clase and ('result' in clase or 'info' in clase)):
+        for texto in bloque.stripped_strings:
+            texto_lower = texto.lower()
+            if 'departamento' in texto_lower or 'región' in texto_lower:
+                departamento = texto.split(':')[-1].strip()
+            elif 'provincia' in texto_lower:
+                provincia = texto.split(':')[-1].strip()
+    
+    return codigo_verificador, departamento, provincia
+
+class DNIScraper(NavegadorGobernado):
     """Web scraper para obtener códigos verificadores de DNI desde elDNI.com"""
     
     def __init__(self, headless: bool = True, delay: int = 1):
         self.url = "https://eldni.com/pe/obtener-digito-verificador-del-dni"
         self.delay = delay
+        self.artefactos = obtener_artefactos()
+        self.perfilador = obtener_perfilador()
+        self.gobernador = obtener_gobernador()
+        self.headless = headless
+        self._consultas = 0
+        self.archivo = obtener_archivo()
         self.setup_logging()
-        self.driver = self.setup_driver(headless)
+        self.driver = None
+        if self.reproduciendo:
+            # Sin navegador ni pausas: todo sale del archivo de respuestas
+            self.delay = 0
+        else:
+            self._abrir_driver()
+    
+    @property
+    def reproduciendo(self) -> bool:
+        return self.archivo is not None and self.archivo.reproduciendo
     
     def setup_logging(self):
-        """Configurar logging"""
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
+        """Configurar logging (una sola vez por proceso)"""
+        configurar_logging()
         self.logger = logging.getLogger(__name__)
     
     def setup_driver(self, headless: bool):
@@ -44,13 +88,19 @@ class DNIScraper:
             chrome_options.add_argument("--no-sandbox")
             chrome_options.add_argument("--disable-dev-shm-usage")
             chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+            # Las pestañas en segundo plano no se congelan (modo --pestanas)
+            chrome_options.add_argument("--disable-background-timer-throttling")
+            chrome_options.add_argument("--disable-renderer-backgrounding")
+            chrome_options.add_argument("--disable-backgrounding-occluded-windows")
             chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
             chrome_options.add_experimental_option('useAutomationExtension', False)
+            # Marca para que limpiar_huerfanos reconozca este Chrome si queda huérfano
+            marcar_navegador(chrome_options)
             
             # User agent para parecer más humano
             chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
             
-            service = Service(ChromeDriverManager().install())
+            service = Service(ruta_chromedriver())
             driver = webdriver.Chrome(service=service, options=chrome_options)
             
             # Ejecutar script para ocultar webdriver
@@ -73,89 +123,249 @@ class DNIScraper:
         Obtener código verificador de un DNI
         Retorna: (codigo_verificador, departamento, provincia)
         """
+        if self.reproduciendo:
+            with self.perfilador.span("get_codigo_verificador", dni, categoria="dni"):
+                return self._reproducir(dni)
+        
+        with self.perfilador.span("get_codigo_verificador", dni, categoria="dni"):
+            try:
+                self._revisar_recursos()
+            except Exception as e:
+                # Sin navegador para esta consulta; la siguiente vuelve a intentar abrirlo
+                return self._registrar_error(dni, e, time.perf_counter())
+            return self._get_codigo_verificador(dni)
+    
+    def _reproducir(self, dni: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """Extraer el resultado de la página grabada en lugar de consultar elDNI.com"""
+        if not self.validate_dni(dni):
+            self.logger.error(f"DNI inválido: {dni}", extra={'dni': dni, 'outcome': 'dni_invalido'})
+            return None, None, None
+        
+        inicio = time.perf_counter()
+        registro = self.archivo.leer(SITIO_ELDNI, dni)
+        if registro is None or not registro['html']:
+            self.logger.warning(f"DNI {dni} no está en el archivo de respuestas",
+                                extra={'dni': dni, 'stage': 'resultado', 'outcome': 'sin_grabacion'})
+            return None, None, None
+        
+        codigo_verificador, departamento, provincia = extraer_resultado_html(registro['html'])
+        return self._registrar_resultado(dni, codigo_verificador, departamento, provincia, inicio)
+    
+    def _grabar(self, dni: str):
+        """Guardar la página de resultado en el archivo de respuestas (modo grabación)"""
+        if not (self.archivo and self.archivo.grabando and self.driver):
+            return
+        try:
+            self.archivo.guardar(SITIO_ELDNI, dni, html=html_con_valores(self.driver))
+        except Exception as e:
+            self.logger.warning(f"No se pudo grabar la respuesta del DNI {dni}: {e}",
+                                extra={'dni': dni, 'stage': 'grabar'})
+    
+    def _get_codigo_verificador(self, dni: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """Consulta de un DNI con un span por cada paso"""
+        span = self.perfilador.span
         if not self.validate_dni(dni):
-            self.logger.error(f"DNI inválido: {dni}")
+            self.logger.error(f"DNI inválido: {dni}", extra={'dni': dni, 'outcome': 'dni_invalido'})
             return None, None, None
         
+        inicio = time.perf_counter()
         try:
-            self.logger.info(f"Procesando DNI: {dni}")
+            self.logger.info(f"Procesando DNI: {dni}", extra={'dni': dni, 'stage': 'inicio'})
             
             # Navegar a la página
-            self.driver.get(self.url)
-            time.sleep(self.delay)
+            with span("navegar", dni):
+                self.driver.get(self.url)
+            with span("pausa_carga", dni, categoria="sleep"):
+                time.sleep(self.delay)
             
             # Buscar el campo de entrada del DNI (usar xpath más genérico)
-            dni_input = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, "//input[@type='text']"))
-            )
+            with span("esperar_input", dni):
+                dni_input = WebDriverWait(self.driver, 10).until(
+                    EC.presence_of_element_located((By.XPATH, "//input[@type='text']"))
+                )
             
             # Limpiar y escribir el DNI
-            dni_input.clear()
-            dni_input.send_keys(dni)
-            time.sleep(1)
+            with span("escribir_dni", dni):
+                dni_input.clear()
+                dni_input.send_keys(dni)
+            with span("pausa_escritura", dni, categoria="sleep"):
+                time.sleep(1)
             
             # Buscar y hacer clic en el botón de consulta
-            consultar_btn = WebDriverWait(self.driver, 10).until(
-                EC.element_to_be_clickable((By.XPATH, "//*[@id='btn-buscar-por-dniveri']"))
-            )
-            consultar_btn.click()
+            with span("click_consultar", dni):
+                consultar_btn = WebDriverWait(self.driver, 10).until(
+                    EC.element_to_be_clickable((By.XPATH, "//*[@id='btn-buscar-por-dniveri']"))
+                )
+                consultar_btn.click()
             
             # Esperar a que aparezca el resultado
-            time.sleep(self.delay + 2)
+            with span("pausa_resultado", dni, categoria="sleep"):
+                time.sleep(self.delay + 2)
             
             # Obtener el código verificador usando el selector específico
-            codigo_verificador_element = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, "//*[@id='digito_verificador']"))
-            )
-            
-            # Intentar obtener el valor del elemento
-            codigo_verificador = codigo_verificador_element.get_attribute("value")
-            if not codigo_verificador:
-                codigo_verificador = codigo_verificador_element.text.strip()
+            with span("leer_codigo", dni):
+                codigo_verificador_element = WebDriverWait(self.driver, 10).until(
+                    EC.presence_of_element_located((By.XPATH, "//*[@id='digito_verificador']"))
+                )
+                
+                # Intentar obtener el valor del elemento
+                codigo_verificador = codigo_verificador_element.get_attribute("value")
+                if not codigo_verificador:
+                    codigo_verificador = codigo_verificador_element.text.strip()
             
-            self.logger.info(f"Código encontrado: {codigo_verificador}")
+            self.logger.info(f"Código encontrado: {codigo_verificador}", extra={'dni': dni, 'stage': 'extraer'})
             
             # Intentar obtener información adicional (departamento, provincia)
-            departamento = None
-            provincia = None
+            with span("info_adicional", dni):
+                departamento, provincia = self._leer_info_adicional(dni)
+            
+            return self._registrar_resultado(dni, codigo_verificador, departamento, provincia, inicio)
+                
+        except Exception as e:
+            return self._registrar_error(dni, e, inicio)
+    
+    def _leer_info_adicional(self, dni: str) -> Tuple[Optional[str], Optional[str]]:
+        """Buscar departamento y provincia en la página de resultado"""
+        departamento = None
+        provincia = None
+        
+        try:
+            # Buscar elementos que puedan contener departamento y provincia
+            info_elements = self.driver.find_elements(By.XPATH, "//div[contains(@class, 'result') or contains(@class, 'info')]//text()")
+            
+            for element in info_elements:
+                text = element.text.lower()
+                if 'departamento' in text or 'región' in text:
+                    departamento = element.text.split(':')[-1].strip()
+                elif 'provincia' in text:
+                    provincia = element.text.split(':')[-1].strip()
+                    
+        except Exception as e:
+            self.logger.warning(f"No se pudo obtener información adicional para DNI {dni}: {e}",
+                                extra={'dni': dni, 'stage': 'info_adicional'})
+        
+        return departamento, provincia
+    
+    def _registrar_resultado(self, dni: str, codigo_verificador: Optional[str], departamento: Optional[str],
+                             provincia: Optional[str], inicio: float) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """Registrar el resultado de una consulta (y capturar artefactos si no hubo código)"""
+        self._grabar(dni)
+        if codigo_verificador:
+            self.logger.info(f"DNI {dni} - Código verificador: {codigo_verificador}",
+                             extra={'dni': dni, 'stage': 'resultado', 'outcome': 'ok',
+                                    'duration': round(time.perf_counter() - inicio, 3)})
+            return codigo_verificador, departamento, provincia
+        
+        # Screenshot + HTML para depuración (muestreado, se escribe en segundo plano)
+        capturado = self.artefactos.capturar(self.driver, "dni_sin_codigo", dni)
+        self.logger.warning(f"No se encontró código verificador para DNI: {dni}" +
+                            (" (artefactos de depuración encolados)" if capturado else ""),
+                            extra={'dni': dni, 'stage': 'resultado', 'outcome': 'no_encontrado',
+                                   'duration': round(time.perf_counter() - inicio, 3)})
+        return None, None, None
+    
+    def _registrar_error(self, dni: str, e: Exception, inicio: float) -> Tuple[None, None, None]:
+        # También la página en la que fallaron los selectores: es la que hace falta para re-extraer
+        self._grabar(dni)
+        self.logger.error(f"Error procesando DNI {dni}: {e}",
+                          extra={'dni': dni, 'stage': 'resultado', 'outcome': 'error',
+                                 'duration': round(time.perf_counter() - inicio, 3)})
+        self.artefactos.capturar(self.driver, f"dni_{type(e).__name__}", dni)
+        return None, None, None
+    
+    def _pasos_codigo_verificador(self, dni: str):
+        """
+        La misma consulta que get_codigo_verificador como tarea de PipelinePestanas:
+        cede Esperar/Pausa en lugar de bloquear con sleeps y WebDriverWait
+        
+        Los spans tienen los mismos nombres que en _get_codigo_verificador; como abarcan
+        los yield, miden lo que tardó este DNI aunque entre medio avancen otras pestañas
+        """
+        span = self.perfilador.span
+        with span("get_codigo_verificador", dni, categoria="dni"):
+            if not self.validate_dni(dni):
+                self.logger.error(f"DNI inválido: {dni}", extra={'dni': dni, 'outcome': 'dni_invalido'})
+                return None, None, None
             
+            inicio = time.perf_counter()
             try:
-                # Buscar elementos que puedan contener departamento y provincia
-                info_elements = self.driver.find_elements(By.XPATH, "//div[contains(@class, 'result') or contains(@class, 'info')]//text()")
+                self.logger.info(f"Procesando DNI: {dni}", extra={'dni': dni, 'stage': 'inicio'})
                 
-                for element in info_elements:
-                    text = element.text.lower()
-                    if 'departamento' in text or 'región' in text:
-                        departamento = element.text.split(':')[-1].strip()
-                    elif 'provincia' in text:
-                        provincia = element.text.split(':')[-1].strip()
-                        
-            except Exception as e:
-                self.logger.warning(f"No se pudo obtener información adicional para DNI {dni}: {e}")
-            
-            if codigo_verificador:
-                self.logger.info(f"DNI {dni} - Código verificador: {codigo_verificador}")
-                return codigo_verificador, departamento, provincia
-            else:
-                # Hacer screenshot para depuración
-                screenshot_path = f"debug_dni_{dni}.png"
-                self.driver.save_screenshot(screenshot_path)
-                self.logger.warning(f"No se encontró código verificador para DNI: {dni}. Screenshot guardado: {screenshot_path}")
+                # Navegar sin bloquear y esperar el documento nuevo
+                with span("navegar", dni):
+                    self.driver.execute_script(SCRIPT_NAVEGAR, self.url)
+                    yield Esperar(pagina_nueva, timeout=30, nombre="carga de página")
+                with span("pausa_carga", dni, categoria="sleep"):
+                    yield Pausa(self.delay)
                 
-                # Obtener HTML para depuración
-                try:
-                    page_source = self.driver.page_source
-                    with open(f"debug_html_{dni}.html", "w", encoding="utf-8") as f:
-                        f.write(page_source)
-                    self.logger.debug(f"HTML guardado: debug_html_{dni}.html")
-                except:
-                    pass
+                with span("esperar_input", dni):
+                    dni_input = yield Esperar(EC.presence_of_element_located((By.XPATH, "//input[@type='text']")),
+                                              nombre="input DNI")
+                with span("escribir_dni", dni):
+                    dni_input.clear()
+                    dni_input.send_keys(dni)
+                with span("pausa_escritura", dni, categoria="sleep"):
+                    yield Pausa(1)
                 
-                return None, None, None
+                with span("click_consultar", dni):
+                    consultar_btn = yield Esperar(EC.element_to_be_clickable((By.XPATH, "//*[@id='btn-buscar-por-dniveri']")),
+                                                  nombre="botón consultar")
+                    consultar_btn.click()
+                with span("pausa_resultado", dni, categoria="sleep"):
+                    yield Pausa(self.delay + 2)
                 
-        except Exception as e:
-            self.logger.error(f"Error procesando DNI {dni}: {e}")
-            return None, None, None
+                with span("leer_codigo", dni):
+                    codigo_verificador_element = yield Esperar(
+                        EC.presence_of_element_located((By.XPATH, "//*[@id='digito_verificador']")),
+                        nombre="dígito verificador"
+                    )
+                    codigo_verificador = codigo_verificador_element.get_attribute("value")
+                    if not codigo_verificador:
+                        codigo_verificador = codigo_verificador_element.text.strip()
+                
+                with span("info_adicional", dni):
+                    departamento, provincia = self._leer_info_adicional(dni)
+                return self._registrar_resultado(dni, codigo_verificador, departamento, provincia, inicio)
+            
+            except Exception as e:
+                return self._registrar_error(dni, e, inicio)
+    
+    def iter_codigos_verificadores(self, dnis: Iterable[str], pestanas: int = 1) -> Iterator[Tuple[str, Optional[str], Optional[str], Optional[str]]]:
+        """
+        Procesar DNIs de forma incremental
+        Acepta cualquier iterable (también generadores) y entrega cada resultado apenas se obtiene:
+        (dni, codigo_verificador, departamento, provincia)
+        
+        Con pestanas > 1 el mismo Chrome trabaja varias consultas a la vez y los
+        resultados llegan en orden de finalización
+        """
+        if pestanas > 1 and not self.reproduciendo:
+            yield from self._iter_con_pestanas(dnis, pestanas)
+            return
+        
+        total = len(dnis) if hasattr(dnis, '__len__') else None
+        
+        for i, dni in enumerate(dnis, 1):
+            # Pausa entre requests para evitar ser bloqueado
+            if i > 1:
+                time.sleep(self.delay)
+            
+            self.logger.info(f"Procesando {i}/{total or '?'}: {dni}", extra={'dni': dni, 'fila': i, 'total': total})
+            
+            codigo, departamento, provincia = self.get_codigo_verificador(dni)
+            yield dni, codigo, departamento, provincia
+    
+    def _iter_con_pestanas(self, dnis: Iterable[str], pestanas: int):
+        """Repartir los DNIs en varias pestañas con PipelinePestanas"""
+        if self.driver is None:
+            self._abrir_driver()
+        pipeline = PipelinePestanas(self.driver, pestanas=pestanas)
+        tareas = ((dni, lambda dni=dni: self._pasos_codigo_verificador(dni)) for dni in dnis)
+        
+        for i, (dni, resultado) in enumerate(pipeline.ejecutar(tareas), 1):
+            codigo, departamento, provincia = resultado or (None, None, None)
+            self.logger.info(f"Completados {i}: {dni}", extra={'dni': dni, 'fila': i})
+            yield dni, codigo, departamento, provincia
     
     def process_multiple_dnis(self, dnis: list) -> dict:
         """
@@ -163,34 +373,23 @@ class DNIScraper:
         Retorna diccionario con resultados
         """
         results = {}
-        total = len(dnis)
         
-        for i, dni in enumerate(dnis, 1):
-            self.logger.info(f"Procesando {i}/{total}: {dni}")
-            
-            codigo, departamento, provincia = self.get_codigo_verificador(dni)
-            
+        for dni, codigo, departamento, provincia in self.iter_codigos_verificadores(dnis):
             results[dni] = {
                 'codigo_verificador': codigo,
                 'departamento': departamento,
                 'provincia': provincia,
                 'success': codigo is not None
             }
-            
-            # Pausa entre requests para evitar ser bloqueado
-            if i < total:
-                time.sleep(self.delay)
         
         return results
     
-    def close(self):
-        """Cerrar el driver"""
-        if self.driver:
-            self.driver.quit()
-            self.logger.info("Driver cerrado")
-    
-    def __enter__(self):
-        return self
-    
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
\ No newline at end of file
+    def process_multiple_dnis_compacto(self, dnis: Iterable[str]) -> AlmacenResultados:
+        """
+        Procesar múltiples DNIs guardando los resultados en arreglos compactos
+        Usar .a_dataframe() para exportar a pandas
+        """
+        almacen = AlmacenResultados()
+        for dni, codigo, departamento, provincia in self.iter_codigos_verificadores(dnis):
+            almacen.agregar(dni, codigo, departamento, provincia)
+        return almacen
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Ubicación de chromedriver resuelta una sola vez por proceso
+Evita importar webdriver_manager (y consultar la red) hasta que realmente se abre un navegador
+"""
+
+import os
+import shutil
+import logging
+import threading
+
+_ruta = None
+_lock = threading.Lock()
+
+
+def ruta_chromedriver() -> str:
+    """
+    Ruta de chromedriver, en este orden:
+    1. Variable de entorno CHROMEDRIVER_PATH
+    2. chromedriver disponible en el PATH (imagen Docker / Railway)
+    3. Descarga con webdriver_manager (solo la primera vez en el proceso)
+    """
+    global _ruta
+    if _ruta:
+        return _ruta
+
+    with _lock:
+        if _ruta:
+            return _ruta
+        ruta = os.environ.get("CHROMEDRIVER_PATH") or shutil.which("chromedriver")
+        if not ruta:
+            from webdriver_manager.chrome import ChromeDriverManager
+            ruta = ChromeDriverManager().install()
+        logging.getLogger(__name__).info(f"Usando chromedriver: {ruta}")
+        _ruta = ruta
+    return _ruta
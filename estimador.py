@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Estimación de duración de una corrida a partir del historial de corridas anteriores
+Cuenta los DNIs que realmente hay que consultar, estima el tiempo para un --delay y una
+concurrencia dados, recomienda la configuración para cumplir un plazo y calcula el ETA en vivo
+"""
+
+import os
+import json
+import time
+import logging
+from statistics import median
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from incremental import comparar_con_anterior, normalizar_dni
+
+FASES = ('codigos', 'ubigeos')
+# Span que envuelve la consulta completa de un DNI en cada fase (perfilador)
+RAIZ_PERFIL = {'codigos': 'get_codigo_verificador', 'ubigeos': 'get_ubigeo'}
+# Sin historial: segundos fijos por DNI y segundos por cada unidad de --delay
+# (las pausas dentro de la consulta y entre consultas escalan con el delay)
+MODELO_INICIAL = {
+    'codigos': {'fijo': 5.0, 'por_delay': 3.0},
+    'ubigeos': {'fijo': 16.0, 'por_delay': 3.0},
+}
+# Aporte de cada pestaña/trabajador adicional si el historial no tiene corridas en paralelo
+EFICIENCIA_PARALELA = 0.7
+# Más pestañas que esto aumentan el riesgo de bloqueo sin ganar mucho
+MAX_CONCURRENCIA = 8
+# Mismo filtro que procesar_ubigeos para armar df_validos
+CODIGOS_SIN_CONSULTA = ('', 'DNI_INVALIDO', 'NO_ENCONTRADO', 'ERROR', 'SIN_GRABACION')
+# Costo de una consulta reproducida desde el archivo de respuestas (I/O local)
+SEGUNDOS_REPRODUCCION = 0.01
+ARCHIVO_HISTORIAL = os.environ.get('HISTORIAL_CORRIDAS', 'historial_corridas.jsonl')
+MAX_HISTORIAL = 50
+
+
+def registrar_corrida(fase: str, consultas: int, segundos: float, delay: float, concurrencia: int,
+                      perfilador=None, archivo: str = ARCHIVO_HISTORIAL):
+    """Agregar una corrida terminada al historial (una línea JSON)"""
+    if consultas <= 0 or segundos <= 0:
+        return
+    registro = {
+        'ts': round(time.time()),
+        'fase': fase,
+        'consultas': consultas,
+        'segundos': round(segundos, 2),
+        'delay': delay,
+        'concurrencia': concurrencia,
+        'segundos_por_dni': round(segundos / consultas, 3),
+    }
+    # Con --profile se guarda también el promedio de cada paso
+    if perfilador is not None and perfilador.activo:
+        registro['pasos'] = {
+            nombre: round(datos['total'] / max(datos['n'], 1), 3)
+            for nombre, datos in perfilador.resumen_por_paso().items()
+        }
+    try:
+        with open(archivo, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+    except OSError as e:
+        logging.getLogger(__name__).warning(f"No se pudo guardar el historial de corridas: {e}")
+
+
+def cargar_historial(fase: str, archivo: str = ARCHIVO_HISTORIAL) -> list:
+    """Últimas corridas registradas de una fase"""
+    if not os.path.exists(archivo):
+        return []
+    corridas = []
+    with open(archivo, encoding='utf-8') as f:
+        for linea in f:
+            try:
+                registro = json.loads(linea)
+            except ValueError:
+                continue
+            if registro.get('fase') == fase:
+                corridas.append(registro)
+    return corridas[-MAX_HISTORIAL:]
+
+
+class ModeloDuracion:
+    """
+    segundos_por_dni = (fijo + por_delay * delay) / (1 + eficiencia * (concurrencia - 1))
+
+    fijo y eficiencia se ajustan con el historial (mediana de las corridas);
+    sin historial se usan MODELO_INICIAL y EFICIENCIA_PARALELA
+    """
+
+    def __init__(self, fase: str, historial: Iterable[dict] = ()):
+        self.fase = fase
+        self.fijo = MODELO_INICIAL[fase]['fijo']
+        self.por_delay = MODELO_INICIAL[fase]['por_delay']
+        self.eficiencia = EFICIENCIA_PARALELA
+        self.corridas = list(historial)
+
+        secuenciales = [r for r in self.corridas if r['concurrencia'] <= 1]
+        if secuenciales:
+            self.fijo = max(median(r['segundos_por_dni'] - self.por_delay * r['delay'] for r in secuenciales), 0.5)
+
+        paralelas = [r for r in self.corridas if r['concurrencia'] > 1]
+        if paralelas:
+            eficiencias = [
+                (self._secuencial(r['delay']) / r['segundos_por_dni'] - 1) / (r['concurrencia'] - 1)
+                for r in paralelas
+            ]
+            self.eficiencia = min(max(median(eficiencias), 0.05), 1.0)
+
+    @property
+    def fuente(self) -> str:
+        if self.corridas:
+            return f"historial ({len(self.corridas)} corridas)"
+        return "valores por defecto (sin historial)"
+
+    def _secuencial(self, delay: float) -> float:
+        return self.fijo + self.por_delay * delay
+
+    def segundos_por_dni(self, delay: float, concurrencia: int = 1) -> float:
+        return self._secuencial(delay) / (1 + self.eficiencia * (max(concurrencia, 1) - 1))
+
+    def pasos_mas_lentos(self, cantidad: int = 5) -> list:
+        """Promedio por paso de las corridas perfiladas, de más lento a más rápido"""
+        acumulado = {}
+        for corrida in self.corridas:
+            for paso, segundos in corrida.get('pasos', {}).items():
+                acumulado.setdefault(paso, []).append(segundos)
+        raiz = RAIZ_PERFIL[self.fase]
+        promedios = [(paso, median(valores)) for paso, valores in acumulado.items() if paso != raiz]
+        return sorted(promedios, key=lambda item: item[1], reverse=True)[:cantidad]
+
+
+def _columna_dni(df: pd.DataFrame) -> Optional[str]:
+    for col in df.columns:
+        if 'DNI' in col.upper() or 'D N I' in col.upper():
+            return col
+    return None
+
+
+def contar_pendientes(archivo_csv, fase: str, inicio_desde: int = 0, cantidad_procesar: Optional[int] = None,
+                      incremental=None, columnas_huella: Iterable[str] = (), reproducir=None,
+                      ubigeo_local: bool = True) -> dict:
+    """
+    Cuántos DNIs del rango hay que consultar realmente (mismo rango que los procesadores)
+
+    Descuenta DNIs inválidos, filas sin cambios frente a la salida anterior, (fase 2)
+    códigos verificadores inválidos y ubigeos resueltos con el índice local, y cuenta
+    los DNIs sin respuesta grabada cuando se reproduce un archivo de respuestas
+    """
+    df = pd.read_csv(archivo_csv, dtype=str)
+    dni_column = _columna_dni(df)
+    if not dni_column:
+        raise ValueError("No se encontró columna de DNI")
+
+    dnis = normalizar_dni(df[dni_column])
+    validos = dnis.str.fullmatch(r'\d{8}')
+    conteo = {'total_filas': len(df), 'dnis_validos': int(validos.sum()), 'dnis_invalidos': int((~validos).sum())}
+    candidatas = pd.Series(True, index=df.index)
+
+    if fase == 'ubigeos':
+        if 'CODIGO_VERIFICADOR' not in df.columns:
+            raise ValueError("No se encontró columna CODIGO_VERIFICADOR")
+        con_codigo = ~df['CODIGO_VERIFICADOR'].fillna('').isin(CODIGOS_SIN_CONSULTA)
+        conteo['sin_codigo_valido'] = int((~con_codigo).sum())
+        candidatas &= con_codigo
+        if ubigeo_local:
+            from ubigeo_local import COLUMNA_UBICACION, resolver_ubigeos_locales
+            if COLUMNA_UBICACION in df.columns:
+                locales = resolver_ubigeos_locales(df)['UBIGEO'].notna()
+                conteo['resueltos_local'] = int((candidatas & locales).sum())
+                candidatas &= ~locales
+
+    if incremental:
+        columna = 'UBIGEO' if fase == 'ubigeos' else 'CODIGO_VERIFICADOR'
+        comparacion, _ = comparar_con_anterior(df, incremental, dni_column, columna, columnas_huella)
+        sin_cambios = comparacion['ESTADO'] == 'sin_cambios'
+        conteo['reutilizados_incremental'] = int((candidatas & sin_cambios).sum())
+        candidatas &= ~sin_cambios
+
+    # Fase 1: el rango es sobre todas las filas; fase 2: sobre los registros que van al Congreso
+    if fase == 'codigos':
+        posiciones = df.index
+    else:
+        posiciones = df.index[candidatas]
+    fin = inicio_desde + cantidad_procesar if cantidad_procesar else len(posiciones)
+    en_rango = posiciones[inicio_desde:fin]
+    pendientes = (candidatas & validos).loc[en_rango]
+    conteo['en_rango'] = len(en_rango)
+    conteo['pendientes'] = int(pendientes.sum())
+    conteo['pendientes_unicos'] = int(dnis.loc[en_rango][pendientes].nunique())
+
+    if reproducir:
+        from archivo_respuestas import ArchivoRespuestas, SITIO_CONGRESO, SITIO_ELDNI
+        archivo = ArchivoRespuestas(reproducir, 'reproducir')
+        grabados = set(archivo.dnis(SITIO_CONGRESO if fase == 'ubigeos' else SITIO_ELDNI))
+        archivo.cerrar()
+        conteo['sin_grabacion'] = int((~dnis.loc[en_rango][pendientes].isin(grabados)).sum())
+
+    return conteo
+
+
+def _consultas(conteo: dict, concurrencia: int) -> int:
+    # Con varias pestañas los DNIs repetidos se consultan una sola vez
+    return conteo['pendientes_unicos'] if concurrencia > 1 else conteo['pendientes']
+
+
+def recomendar(modelo: ModeloDuracion, conteo: dict, plazo_segundos: float, delay: float,
+               max_concurrencia: int = MAX_CONCURRENCIA) -> Optional[dict]:
+    """
+    La configuración más conservadora que cumple el plazo: el mayor delay
+    (hasta el actual, mínimo 1 s) con la menor concurrencia posible
+    """
+    delays = sorted({max(delay - paso, 1) for paso in range(int(max(delay, 1)))} | {max(delay, 1)}, reverse=True)
+    for candidato in delays:
+        for concurrencia in range(1, max_concurrencia + 1):
+            segundos = _consultas(conteo, concurrencia) * modelo.segundos_por_dni(candidato, concurrencia)
+            if segundos <= plazo_segundos:
+                return {'delay': candidato, 'concurrencia': concurrencia, 'segundos': segundos}
+    return None
+
+
+def formatear_duracion(segundos: Optional[float]) -> str:
+    if segundos is None:
+        return '?'
+    segundos = int(segundos)
+    horas, resto = divmod(segundos, 3600)
+    minutos, segundos = divmod(resto, 60)
+    if horas:
+        return f"{horas}h{minutos:02d}m"
+    if minutos:
+        return f"{minutos}m{segundos:02d}s"
+    return f"{segundos}s"
+
+
+def planificar(archivo_csv, fase: str, delay: float, concurrencia: int = 1, plazo_horas: Optional[float] = None,
+               inicio_desde: int = 0, cantidad_procesar: Optional[int] = None, incremental=None,
+               columnas_huella: Iterable[str] = (), reproducir=None, ubigeo_local: bool = True) -> dict:
+    """Imprimir el plan de una corrida (sin consultar ningún sitio) y retornarlo"""
+    conteo = contar_pendientes(archivo_csv, fase, inicio_desde, cantidad_procesar, incremental,
+                               columnas_huella, reproducir, ubigeo_local)
+    modelo = ModeloDuracion(fase, cargar_historial(fase))
+
+    if reproducir:
+        estimado = conteo['en_rango'] * SEGUNDOS_REPRODUCCION
+    else:
+        estimado = _consultas(conteo, concurrencia) * modelo.segundos_por_dni(delay, concurrencia)
+    plan = {'conteo': conteo, 'segundos_estimados': estimado, 'recomendacion': None}
+
+    print(f"\n{'='*60}")
+    print(f"PLAN DE LA CORRIDA ({'códigos verificadores' if fase == 'codigos' else 'ubigeos'})")
+    print(f"{'='*60}")
+    print(f"Filas en el archivo: {conteo['total_filas']}  (DNIs válidos: {conteo['dnis_validos']}, "
+          f"inválidos: {conteo['dnis_invalidos']})")
+    for clave, texto in (('sin_codigo_valido', 'Sin código verificador válido'),
+                         ('resueltos_local', 'Resueltos con el índice local de ubigeos'),
+                         ('reutilizados_incremental', 'Reutilizados de la salida anterior'),
+                         ('sin_grabacion', 'Sin respuesta en el archivo a reproducir')):
+        if clave in conteo:
+            print(f"{texto}: {conteo[clave]}")
+    print(f"Registros en el rango: {conteo['en_rango']}")
+    print(f"DNIs a consultar: {conteo['pendientes']} ({conteo['pendientes_unicos']} únicos)")
+    print(f"Modelo: {modelo.fuente} - {modelo.fijo:.1f}s fijos + {modelo.por_delay:.0f} x delay por DNI, "
+          f"eficiencia por pestaña adicional {modelo.eficiencia:.0%}")
+    pasos = modelo.pasos_mas_lentos()
+    if pasos:
+        print("Pasos más lentos: " + ", ".join(f"{paso}={segundos:.2f}s" for paso, segundos in pasos))
+    print(f"Duración estimada (delay={delay}, pestañas={concurrencia}): {formatear_duracion(estimado)}")
+
+    if plazo_horas and not reproducir:
+        recomendacion = recomendar(modelo, conteo, plazo_horas * 3600, delay)
+        plan['recomendacion'] = recomendacion
+        if recomendacion:
+            print(f"Para terminar en {plazo_horas}h: --delay {recomendacion['delay']} "
+                  f"--pestanas {recomendacion['concurrencia']} "
+                  f"(~{formatear_duracion(recomendacion['segundos'])})")
+        else:
+            mejor = _consultas(conteo, MAX_CONCURRENCIA) * modelo.segundos_por_dni(1, MAX_CONCURRENCIA)
+            print(f"No se llega a {plazo_horas}h ni con --delay 1 --pestanas {MAX_CONCURRENCIA} "
+                  f"(~{formatear_duracion(mejor)}); dividir el archivo con --inicio/--cantidad entre varias instancias")
+    print(f"{'='*60}")
+    return plan
+
+
+class EtaEnVivo:
+    """Tiempo restante de una corrida según el ritmo observado hasta ahora"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.completados = 0
+        self.inicio = time.monotonic()
+
+    def avanzar(self, cantidad: int = 1):
+        self.completados += cantidad
+
+    def actualizar(self, completados: int):
+        self.completados = completados
+
+    @property
+    def segundos_restantes(self) -> Optional[float]:
+        if not self.completados:
+            return None
+        ritmo = (time.monotonic() - self.inicio) / self.completados
+        return max(self.total - self.completados, 0) * ritmo
+
+    def texto(self) -> str:
+        return f"ETA {formatear_duracion(self.segundos_restantes)}"
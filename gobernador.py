@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+Gobernador de recursos para los navegadores
+Limita los Chrome activos a lo que el contenedor soporta (memoria y CPU del cgroup),
+recicla los navegadores que crecen demasiado y elimina los Chrome huérfanos que abrió este código
+NavegadorGobernado reúne la apertura, el reciclaje y el cierre del navegador de cada scraper
+"""
+
+import os
+import time
+import signal
+import logging
+import threading
+from typing import Dict, Optional, Set
+
+PROC = '/proc'
+# Procesos que pueden ser un navegador de Selenium (solo se miran los que además llevan la marca)
+NOMBRES_NAVEGADOR = ('chrome', 'chromium', 'headless_shell')
+# Switch propio (Chrome ignora los que no conoce) con el PID del proceso Python que abrió el navegador
+MARCA_NAVEGADOR = '--dni-automation-owner='
+# Un huérfano debe tener al menos esta edad (evita matar un driver que se está creando)
+EDAD_MINIMA_HUERFANO = 60
+
+
+def _leer(ruta: str) -> Optional[str]:
+    try:
+        with open(ruta) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def limite_memoria() -> Optional[int]:
+    """Límite de memoria del contenedor en bytes (cgroup v2, v1 o memoria total del equipo)"""
+    for ruta in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        valor = _leer(ruta)
+        # cgroup v1 usa un número enorme para "sin límite"
+        if valor and valor.isdigit() and int(valor) < 1 << 60:
+            return int(valor)
+    return _meminfo('MemTotal')
+
+
+def uso_memoria() -> Optional[int]:
+    """Memoria usada por el contenedor en bytes"""
+    for ruta in ('/sys/fs/cgroup/memory.current', '/sys/fs/cgroup/memory/memory.usage_in_bytes'):
+        valor = _leer(ruta)
+        if valor and valor.isdigit():
+            return int(valor)
+    total, disponible = _meminfo('MemTotal'), _meminfo('MemAvailable')
+    if total and disponible:
+        return total - disponible
+    return None
+
+
+def _meminfo(campo: str) -> Optional[int]:
+    contenido = _leer(os.path.join(PROC, 'meminfo')) or ''
+    for linea in contenido.splitlines():
+        if linea.startswith(campo + ':'):
+            return int(linea.split()[1]) * 1024
+    return None
+
+
+def cpus_disponibles() -> float:
+    """CPUs que puede usar el contenedor (cuota del cgroup o núcleos del equipo)"""
+    cuota = _leer('/sys/fs/cgroup/cpu.max')
+    if cuota and not cuota.startswith('max'):
+        limite, periodo = cuota.split()[:2]
+        return int(limite) / int(periodo)
+    limite = _leer('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+    periodo = _leer('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+    if limite and periodo and int(limite) > 0:
+        return int(limite) / int(periodo)
+    try:
+        return float(len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return float(os.cpu_count() or 1)
+
+
+def marcar_navegador(chrome_options):
+    """Marcar el Chrome que se va a abrir como propio (único criterio de limpiar_huerfanos)"""
+    chrome_options.add_argument(f"{MARCA_NAVEGADOR}{os.getpid()}")
+
+
+def _dueno(pid: int) -> Optional[int]:
+    """PID del proceso que abrió este navegador según su marca, o None si no está marcado"""
+    try:
+        with open(os.path.join(PROC, str(pid), 'cmdline'), 'rb') as f:
+            argumentos = f.read().decode('utf-8', 'replace').split('\0')
+    except OSError:
+        return None
+    for argumento in argumentos:
+        if argumento.startswith(MARCA_NAVEGADOR):
+            valor = argumento[len(MARCA_NAVEGADOR):]
+            return int(valor) if valor.isdigit() else None
+    return None
+
+
+def _procesos() -> Dict[int, dict]:
+    """pid -> {ppid, nombre, estado, rss, cpu_ticks, inicio} leyendo /proc"""
+    pagina = os.sysconf('SC_PAGE_SIZE')
+    procesos = {}
+    for entrada in os.listdir(PROC):
+        if not entrada.isdigit():
+            continue
+        stat = _leer(os.path.join(PROC, entrada, 'stat'))
+        statm = _leer(os.path.join(PROC, entrada, 'statm'))
+        if not stat or not statm:
+            continue
+        # El nombre va entre paréntesis y puede contener espacios
+        nombre = stat[stat.index('(') + 1:stat.rindex(')')]
+        campos = stat[stat.rindex(')') + 2:].split()
+        procesos[int(entrada)] = {
+            'ppid': int(campos[1]),
+            'nombre': nombre,
+            'estado': campos[0],
+            'rss': int(statm.split()[1]) * pagina,
+            'cpu_ticks': int(campos[11]) + int(campos[12]),
+            'inicio': int(campos[19]),
+        }
+    return procesos
+
+
+def _arbol(raiz: int, procesos: Dict[int, dict]) -> Set[int]:
+    hijos = {}
+    for pid, datos in procesos.items():
+        hijos.setdefault(datos['ppid'], []).append(pid)
+    arbol, pendientes = set(), [raiz]
+    while pendientes:
+        pid = pendientes.pop()
+        if pid in procesos and pid not in arbol:
+            arbol.add(pid)
+            pendientes.extend(hijos.get(pid, []))
+    return arbol
+
+
+def pid_driver(driver) -> Optional[int]:
+    """PID de chromedriver (raíz del árbol de procesos del navegador)"""
+    try:
+        return driver.service.process.pid
+    except AttributeError:
+        return None
+
+
+class Gobernador:
+    """
+    Cupos de navegadores según memoria/CPU y control de los árboles de procesos de cada driver
+
+    Uso:
+        gobernador.adquirir(timeout)   # antes de abrir Chrome (espera hasta timeout si no hay cupo)
+        gobernador.registrar(driver)
+        if gobernador.debe_reciclar(driver): ...
+        gobernador.liberar(driver)     # después de driver.quit()
+    """
+
+    def __init__(self, mb_por_navegador: float = 400, reserva_mb: float = 256, max_rss_mb: float = 1024,
+                 navegadores_por_cpu: float = 2, max_navegadores: Optional[int] = None, revisar_cada: int = 10,
+                 espera_cupo: float = 120):
+        """
+        Args:
+            mb_por_navegador: Memoria estimada de un Chrome (se ajusta con lo medido)
+            reserva_mb: Memoria que se deja libre para Python/pandas
+            max_rss_mb: Un navegador que supera esta memoria se recicla
+            navegadores_por_cpu: Navegadores simultáneos por CPU disponible
+            max_navegadores: Tope fijo adicional (None = solo el calculado)
+            revisar_cada: Consultas entre dos mediciones de memoria de un mismo navegador
+            espera_cupo: Segundos máximos que un scraper espera un cupo antes de fallar
+        """
+        self.mb_por_navegador = mb_por_navegador
+        self.reserva_mb = reserva_mb
+        self.max_rss_mb = max_rss_mb
+        self.navegadores_por_cpu = navegadores_por_cpu
+        self.max_navegadores = max_navegadores
+        self.revisar_cada = max(revisar_cada, 1)
+        self.espera_cupo = espera_cupo
+        self.logger = logging.getLogger(__name__)
+        self.disponible = os.path.isdir(PROC)
+
+        self._condicion = threading.Condition()
+        self._activos = 0
+        self._drivers = {}
+        # PIDs de chromedriver de drivers ya liberados que todavía no se recogieron
+        self._por_recoger = set()
+        self._muestra_cpu = None
+
+    # --- Cupos ---
+
+    def capacidad(self) -> int:
+        """Navegadores que el contenedor soporta ahora (siempre al menos 1)"""
+        cpus = cpus_disponibles()
+        capacidad = max(int(cpus * self.navegadores_por_cpu), 1)
+        # CPU saturada por los navegadores: no abrir más de los que ya hay
+        if self.uso_cpu() > cpus * 0.9:
+            capacidad = min(capacidad, max(self._activos, 1))
+
+        limite, uso = limite_memoria(), uso_memoria()
+        if self.disponible and limite and uso is not None:
+            # Memoria ocupada por lo que no son nuestros navegadores
+            propia = uso - self.rss_navegadores()
+            libre_mb = (limite - propia) / 2**20 - self.reserva_mb
+            capacidad = min(capacidad, max(int(libre_mb // self.mb_por_navegador), 1))
+
+        if self.max_navegadores:
+            capacidad = min(capacidad, self.max_navegadores)
+        return max(capacidad, 1)
+
+    def adquirir(self, timeout: Optional[float] = None) -> bool:
+        """Esperar un cupo para abrir un navegador; False si se agota el tiempo"""
+        limite = time.monotonic() + timeout if timeout is not None else None
+        with self._condicion:
+            while self._activos >= self.capacidad():
+                restante = limite - time.monotonic() if limite is not None else 1.0
+                if restante <= 0:
+                    return False
+                # Se vuelve a calcular la capacidad cada segundo (la memoria libre cambia)
+                self._condicion.wait(timeout=min(restante, 1.0))
+            self._activos += 1
+            return True
+
+    def registrar(self, driver):
+        pid = pid_driver(driver)
+        if pid:
+            with self._condicion:
+                self._drivers[id(driver)] = pid
+
+    def liberar(self, driver=None):
+        """Devolver el cupo de un navegador ya cerrado y recoger sus procesos zombie"""
+        with self._condicion:
+            if driver is not None:
+                pid = self._drivers.pop(id(driver), None)
+                if pid:
+                    self._por_recoger.add(pid)
+            self._activos = max(self._activos - 1, 0)
+            self._condicion.notify_all()
+        self.recoger_zombies()
+
+    # --- Medición ---
+
+    def medir(self, driver) -> Optional[float]:
+        """Memoria (MB) del árbol chromedriver + chrome + renderers de un driver"""
+        pid = pid_driver(driver)
+        if not (self.disponible and pid):
+            return None
+        procesos = _procesos()
+        return sum(procesos[p]['rss'] for p in _arbol(pid, procesos)) / 2**20
+
+    def rss_navegadores(self) -> int:
+        """Memoria en bytes de todos los navegadores registrados"""
+        with self._condicion:
+            raices = list(self._drivers.values())
+        if not raices:
+            return 0
+        procesos = _procesos()
+        pids = set().union(*(_arbol(raiz, procesos) for raiz in raices))
+        return sum(procesos[p]['rss'] for p in pids)
+
+    def uso_cpu(self) -> float:
+        """CPUs usadas por los navegadores registrados desde la medición anterior"""
+        with self._condicion:
+            raices = list(self._drivers.values())
+        if not (self.disponible and raices):
+            return 0.0
+        procesos = _procesos()
+        pids = set().union(*(_arbol(raiz, procesos) for raiz in raices))
+        ticks = sum(procesos[p]['cpu_ticks'] for p in pids)
+        ahora = time.monotonic()
+
+        anterior, self._muestra_cpu = self._muestra_cpu, (ticks, ahora)
+        if anterior is None or ahora - anterior[1] < 0.5 or ticks < anterior[0]:
+            return 0.0
+        return (ticks - anterior[0]) / os.sysconf('SC_CLK_TCK') / (ahora - anterior[1])
+
+    def debe_reciclar(self, driver) -> bool:
+        """True si el navegador creció más de max_rss_mb o el contenedor está cerca de su límite"""
+        rss_mb = self.medir(driver)
+        if rss_mb is None:
+            return False
+        # El promedio medido reemplaza a la estimación inicial para calcular la capacidad
+        self.mb_por_navegador = max(self.mb_por_navegador * 0.8 + rss_mb * 0.2, 100)
+
+        limite, uso = limite_memoria(), uso_memoria()
+        presion = bool(limite and uso and uso > limite * 0.9)
+        if rss_mb > self.max_rss_mb or (presion and rss_mb > self.mb_por_navegador):
+            self.logger.warning(f"Reciclando navegador: {rss_mb:.0f} MB "
+                                f"(máximo {self.max_rss_mb} MB, presión de memoria: {presion})")
+            return True
+        return False
+
+    # --- Limpieza ---
+
+    def recoger_zombies(self) -> int:
+        """
+        Recoger los chromedriver ya liberados que terminaron sin que nadie los esperara
+        Solo se miran los PIDs anotados por registrar(): otros hijos del proceso no son nuestros
+        """
+        with self._condicion:
+            pendientes = list(self._por_recoger)
+        recogidos = 0
+        for pid in pendientes:
+            try:
+                terminado, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                # Ya lo esperó Selenium (o no es hijo de este proceso)
+                terminado = pid
+            else:
+                if terminado:
+                    recogidos += 1
+            if terminado:
+                with self._condicion:
+                    self._por_recoger.discard(pid)
+        return recogidos
+
+    def limpiar_huerfanos(self) -> int:
+        """
+        Terminar navegadores marcados por marcar_navegador que quedaron sin dueño
+        (restos de corridas que murieron sin driver.quit())
+
+        Solo se consideran huérfanos los Chrome con la marca cuyo proceso dueño ya no existe,
+        o cuyo dueño es este proceso pero no pertenecen a ningún driver registrado. Los navegadores
+        de otros procesos vivos (otra fase, el web service, el Chrome del escritorio) no se tocan.
+        Se termina el árbol del navegador y su chromedriver.
+        """
+        if not self.disponible:
+            return 0
+        procesos = _procesos()
+        with self._condicion:
+            raices = list(self._drivers.values())
+        propios = set().union(*(_arbol(raiz, procesos) for raiz in raices)) if raices else set()
+
+        ticks = os.sysconf('SC_CLK_TCK')
+        uptime = float((_leer(os.path.join(PROC, 'uptime')) or '0').split()[0])
+        objetivos = set()
+        for pid, datos in procesos.items():
+            if pid in propios or not datos['nombre'].lower().startswith(NOMBRES_NAVEGADOR):
+                continue
+            dueno = _dueno(pid)
+            if dueno is None:
+                continue
+            if dueno == os.getpid():
+                # Un driver que se está creando todavía no está registrado
+                if uptime - datos['inicio'] / ticks < EDAD_MINIMA_HUERFANO:
+                    continue
+            elif dueno in procesos:
+                continue
+
+            raiz = pid
+            padre = procesos.get(datos['ppid'])
+            if padre and padre['nombre'].lower().startswith('chromedriver') and datos['ppid'] not in propios:
+                raiz = datos['ppid']
+            objetivos |= _arbol(raiz, procesos)
+
+        eliminados = 0
+        for pid in objetivos:
+            try:
+                if os.stat(os.path.join(PROC, str(pid))).st_uid != os.getuid():
+                    continue
+                os.kill(pid, signal.SIGKILL)
+                eliminados += 1
+            except (OSError, ProcessLookupError):
+                continue
+
+        self.recoger_zombies()
+        if eliminados:
+            self.logger.warning(f"Procesos de navegador huérfanos eliminados: {eliminados}")
+        return eliminados
+
+    def estado(self) -> dict:
+        limite, uso = limite_memoria(), uso_memoria()
+        return {
+            'activos': self._activos,
+            'capacidad': self.capacidad(),
+            'cpus': cpus_disponibles(),
+            'memoria_limite_mb': round(limite / 2**20) if limite else None,
+            'memoria_uso_mb': round(uso / 2**20) if uso is not None else None,
+            'mb_por_navegador': round(self.mb_por_navegador),
+        }
+
+
+class NavegadorGobernado:
+    """
+    Ciclo de vida del navegador de un scraper bajo el gobernador compartido
+
+    La clase que lo usa define setup_driver(headless) y los atributos gobernador,
+    perfilador, logger, headless, driver (None al inicio) y _consultas
+    """
+
+    def _abrir_driver(self):
+        """Abrir Chrome cuando el gobernador da un cupo (espera hasta espera_cupo segundos)"""
+        if not self.gobernador.adquirir(timeout=self.gobernador.espera_cupo):
+            raise TimeoutError(f"Sin cupo para abrir Chrome después de {self.gobernador.espera_cupo:.0f}s")
+        try:
+            with self.perfilador.span("setup_driver", categoria="driver"):
+                self.driver = self.setup_driver(self.headless)
+        except Exception:
+            self.gobernador.liberar()
+            raise
+        self.gobernador.registrar(self.driver)
+        self._driver_abierto()
+
+    def _driver_abierto(self):
+        """Para preparar lo que depende de cada navegador nuevo (por defecto nada)"""
+
+    def _revisar_recursos(self):
+        """
+        Reabrir el navegador si no hay uno y, cada tantas consultas, reciclarlo si creció demasiado
+        Si no se puede abrir el nuevo, queda self.driver = None y se reintenta en la próxima consulta
+        """
+        if self.driver is None:
+            self._abrir_driver()
+            return
+        self._consultas += 1
+        if self._consultas % self.gobernador.revisar_cada:
+            return
+        if self.gobernador.debe_reciclar(self.driver):
+            with self.perfilador.span("reciclar_driver", categoria="driver"):
+                try:
+                    self._cerrar_driver()
+                except Exception as e:
+                    self.logger.warning(f"Error cerrando el navegador a reciclar: {e}")
+                self.gobernador.limpiar_huerfanos()
+                self._abrir_driver()
+
+    def _cerrar_driver(self):
+        try:
+            self.driver.quit()
+        finally:
+            self.gobernador.liberar(self.driver)
+            self.driver = None
+
+    def close(self):
+        """Cerrar el driver"""
+        if self.driver:
+            self._cerrar_driver()
+            self.logger.info("Driver cerrado")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+_gobernador = None
+_lock = threading.Lock()
+
+
+def obtener_gobernador() -> Gobernador:
+    """Gobernador compartido por proceso, configurado por variables de entorno"""
+    global _gobernador
+    with _lock:
+        if _gobernador is None:
+            maximo = os.environ.get('GOBERNADOR_MAX_NAVEGADORES')
+            _gobernador = Gobernador(
+                mb_por_navegador=float(os.environ.get('GOBERNADOR_MB_POR_NAVEGADOR', 400)),
+                reserva_mb=float(os.environ.get('GOBERNADOR_RESERVA_MB', 256)),
+                max_rss_mb=float(os.environ.get('GOBERNADOR_MAX_RSS_MB', 1024)),
+                navegadores_por_cpu=float(os.environ.get('GOBERNADOR_NAVEGADORES_POR_CPU', 2)),
+                max_navegadores=int(maximo) if maximo else None,
+                revisar_cada=int(os.environ.get('GOBERNADOR_REVISAR_CADA', 10)),
+                espera_cupo=float(os.environ.get('GOBERNADOR_ESPERA_CUPO', 120)),
+            )
+        return _gobernador
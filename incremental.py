@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Re-procesamiento incremental contra una salida anterior
+Las filas sin cambios reutilizan el CODIGO_VERIFICADOR / UBIGEO ya obtenido y solo
+las filas nuevas o modificadas se envían a los scrapers
+"""
+
+import logging
+from pathlib import Path
+from typing import Iterable, Tuple
+
+import pandas as pd
+
+# Resultados que no se reutilizan: la fila se vuelve a consultar
+VALORES_FALLIDOS = {'', 'NAN', 'ERROR', 'NO_ENCONTRADO', 'DNI_INVALIDO', 'SIN_CODIGO_VALIDO', 'SIN_GRABACION'}
+
+ESTADOS = ('sin_cambios', 'modificada', 'nueva', 'reintento')
+
+
+def normalizar_dni(serie: pd.Series) -> pd.Series:
+    """DNI como texto de 8 dígitos (mismo criterio que limpiar_dni, vectorizado)"""
+    dni = serie.fillna('').astype(str).str.replace(r'[^0-9]', '', regex=True)
+    return dni.str.zfill(8).where(dni != '', '')
+
+
+def _normalizar_valores(serie: pd.Series) -> pd.Series:
+    """Texto sin espacios extremos; '7.0' y '7' cuentan como el mismo valor"""
+    return (
+        serie.fillna('').astype(str).str.strip()
+        .str.replace(r'^(\d+)\.0+$', r'\1', regex=True)
+    )
+
+
+def huellas(df: pd.DataFrame, dni_column: str, columnas: Iterable[str]) -> pd.Series:
+    """
+    Huella de 64 bits por fila a partir del DNI y las columnas relevantes
+    Una columna ausente cuenta como vacía
+    """
+    partes = pd.DataFrame({'DNI': normalizar_dni(df[dni_column])}, index=df.index)
+    for columna in columnas:
+        partes[columna] = _normalizar_valores(df[columna]) if columna in df.columns else ''
+    return pd.util.hash_pandas_object(partes, index=False)
+
+
+def _columna_dni(df: pd.DataFrame, preferida: str) -> str:
+    if preferida in df.columns:
+        return preferida
+    for col in df.columns:
+        if 'DNI' in col.upper() or 'D N I' in col.upper():
+            return col
+    raise ValueError("La salida anterior no tiene columna de DNI")
+
+
+def comparar_con_anterior(df: pd.DataFrame, archivo_anterior, dni_column: str, columna_resultado: str,
+                          columnas: Iterable[str] = ()) -> Tuple[pd.DataFrame, int]:
+    """
+    Clasificar cada fila de df frente a la salida anterior
+
+    Args:
+        df: Registros actuales
+        archivo_anterior: CSV generado por una corrida previa
+        dni_column: Columna de DNI en df
+        columna_resultado: Columna a reutilizar ('CODIGO_VERIFICADOR' o 'UBIGEO')
+        columnas: Columnas, además del DNI, que invalidan el resultado si cambian
+
+    Returns:
+        (comparacion, eliminadas): DataFrame con ESTADO y VALOR_ANTERIOR (mismo índice que df)
+        y cantidad de DNIs de la salida anterior que ya no están
+    """
+    columnas = [c for c in columnas if c != columna_resultado]
+    anterior = pd.read_csv(archivo_anterior, dtype=str)
+    if columna_resultado not in anterior.columns:
+        raise ValueError(f"La salida anterior {archivo_anterior} no tiene columna {columna_resultado}")
+
+    dni_anterior = _columna_dni(anterior, dni_column)
+    previas = pd.DataFrame({
+        'HUELLA': huellas(anterior, dni_anterior, columnas),
+        'VALOR': _normalizar_valores(anterior[columna_resultado]),
+    })
+    previas.index = normalizar_dni(anterior[dni_anterior])
+    # Si un DNI aparece varias veces vale la última fila
+    previas = previas[previas.index != ''].loc[lambda p: ~p.index.duplicated(keep='last')]
+
+    claves = normalizar_dni(df[dni_column])
+    huella_actual = huellas(df, dni_column, columnas)
+    huella_previa = claves.map(previas['HUELLA'])
+    valor_previo = claves.map(previas['VALOR'])
+
+    comparacion = pd.DataFrame(index=df.index)
+    comparacion['ESTADO'] = 'sin_cambios'
+    comparacion.loc[valor_previo.str.upper().isin(VALORES_FALLIDOS), 'ESTADO'] = 'reintento'
+    comparacion.loc[huella_previa.notna() & (huella_previa != huella_actual), 'ESTADO'] = 'modificada'
+    comparacion.loc[huella_previa.isna() | (claves == ''), 'ESTADO'] = 'nueva'
+    comparacion['VALOR_ANTERIOR'] = valor_previo.where(comparacion['ESTADO'] == 'sin_cambios')
+
+    eliminadas = int((~previas.index.isin(claves)).sum())
+    return comparacion, eliminadas
+
+
+def aplicar_incremental(df: pd.DataFrame, archivo_anterior, dni_column: str, columna_resultado: str,
+                        columnas: Iterable[str] = (), candidatas: pd.Series = None) -> Tuple[pd.Series, dict]:
+    """
+    Copiar a df los resultados de las filas sin cambios
+
+    Args:
+        candidatas: Máscara de filas que pueden reutilizar resultados (None = todas)
+
+    Returns:
+        (reutilizadas, resumen): máscara de filas ya resueltas y conteo por estado
+    """
+    logger = logging.getLogger(__name__)
+    if not Path(archivo_anterior).exists():
+        raise FileNotFoundError(f"No se encuentra la salida anterior: {archivo_anterior}")
+
+    comparacion, eliminadas = comparar_con_anterior(df, archivo_anterior, dni_column, columna_resultado, columnas)
+    reutilizadas = comparacion['ESTADO'] == 'sin_cambios'
+    if candidatas is not None:
+        reutilizadas &= candidatas
+    df.loc[reutilizadas, columna_resultado] = comparacion.loc[reutilizadas, 'VALOR_ANTERIOR']
+
+    conteo = comparacion['ESTADO'].value_counts()
+    resumen = {estado: int(conteo.get(estado, 0)) for estado in ESTADOS}
+    resumen['reutilizadas'] = int(reutilizadas.sum())
+    resumen['eliminadas'] = eliminadas
+    logger.info(f"Modo incremental contra {archivo_anterior}: {resumen}")
+    return reutilizadas, resumen
+
+
+def imprimir_diferencias(resumen: dict):
+    """Resumen de cambios frente a la corrida anterior"""
+    print(f"Incremental - sin cambios: {resumen['sin_cambios']} (reutilizadas: {resumen['reutilizadas']}), "
+          f"modificadas: {resumen['modificada']}, nuevas: {resumen['nueva']}, "
+          f"reintentos: {resumen['reintento']}, eliminadas: {resumen['eliminadas']}")
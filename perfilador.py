@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Perfilador de consultas por DNI
+Registra spans con tiempos de cada paso y los exporta en formato Chrome trace (Perfetto)
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from collections import defaultdict
+
+
+class Perfilador:
+    """Registro de spans (inicio, duración) por DNI y por paso"""
+
+    def __init__(self, activo: bool = True):
+        self.activo = activo
+        self.logger = logging.getLogger(__name__)
+        self._eventos = []
+        self._lock = threading.Lock()
+        self._origen = time.perf_counter()
+
+    @contextmanager
+    def span(self, nombre: str, dni: str = None, categoria: str = "paso", **args):
+        """
+        Medir un bloque de código
+
+        Uso:
+            with perfilador.span("navegar", dni):
+                driver.get(url)
+        """
+        if not self.activo:
+            yield
+            return
+
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            fin = time.perf_counter()
+            evento = {
+                "name": nombre,
+                "cat": categoria,
+                "ph": "X",
+                "ts": round((inicio - self._origen) * 1e6),
+                "dur": round((fin - inicio) * 1e6),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": dict(args, dni=dni) if dni else args,
+            }
+            with self._lock:
+                self._eventos.append(evento)
+
+    def guardar_chrome_trace(self, archivo: str):
+        """Escribir los spans como JSON de Chrome trace (abrir en chrome://tracing o ui.perfetto.dev)"""
+        with self._lock:
+            eventos = list(self._eventos)
+
+        hilos = {e["tid"] for e in eventos}
+        metadatos = [
+            {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid,
+             "args": {"name": f"scraper-{i}"}}
+            for i, tid in enumerate(sorted(hilos))
+        ]
+        with open(archivo, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadatos + eventos, "displayTimeUnit": "ms"}, f)
+        self.logger.info(f"Traza guardada en: {archivo} ({len(eventos)} spans)")
+
+    def resumen_por_dni(self, raiz: str) -> list:
+        """
+        Duración total de cada DNI y desglose por paso
+
+        Args:
+            raiz: Nombre del span que envuelve la consulta completa de un DNI
+
+        Returns:
+            Lista de (dni, segundos_totales, {paso: segundos}) ordenada de más lento a más rápido
+        """
+        totales = defaultdict(float)
+        pasos = defaultdict(lambda: defaultdict(float))
+        with self._lock:
+            for evento in self._eventos:
+                dni = evento["args"].get("dni")
+                if not dni:
+                    continue
+                segundos = evento["dur"] / 1e6
+                if evento["name"] == raiz:
+                    totales[dni] += segundos
+                else:
+                    pasos[dni][evento["name"]] += segundos
+        return sorted(
+            ((dni, total, dict(pasos[dni])) for dni, total in totales.items()),
+            key=lambda item: item[1],
+            reverse=True
+        )
+
+    def resumen_por_paso(self) -> dict:
+        """Cantidad, total y máximo en segundos por nombre de span"""
+        resumen = defaultdict(lambda: {"n": 0, "total": 0.0, "max": 0.0})
+        with self._lock:
+            for evento in self._eventos:
+                datos = resumen[evento["name"]]
+                segundos = evento["dur"] / 1e6
+                datos["n"] += 1
+                datos["total"] += segundos
+                datos["max"] = max(datos["max"], segundos)
+        return dict(resumen)
+
+    def imprimir_resumen(self, raiz: str, cantidad: int = 10):
+        """Mostrar los pasos más costosos y los DNIs más lentos"""
+        print(f"\n{'='*60}")
+        print("PERFIL DE TIEMPOS POR PASO")
+        print(f"{'='*60}")
+        pasos = sorted(self.resumen_por_paso().items(), key=lambda item: item[1]["total"], reverse=True)
+        for nombre, datos in pasos:
+            promedio = datos["total"] / max(datos["n"], 1)
+            print(f"{nombre:<28} n={datos['n']:<6} total={datos['total']:9.2f}s "
+                  f"prom={promedio:6.2f}s max={datos['max']:6.2f}s")
+
+        print(f"\nDNIs MÁS LENTOS")
+        for dni, total, desglose in self.resumen_por_dni(raiz)[:cantidad]:
+            principales = sorted(desglose.items(), key=lambda item: item[1], reverse=True)[:3]
+            detalle = ", ".join(f"{paso}={segundos:.2f}s" for paso, segundos in principales)
+            print(f"{dni}: {total:6.2f}s ({detalle})")
+        print(f"{'='*60}")
+
+
+_perfilador = Perfilador(activo=False)
+
+
+def obtener_perfilador() -> Perfilador:
+    """Perfilador compartido por proceso (inactivo salvo que se llame a activar_perfilador)"""
+    return _perfilador
+
+
+def activar_perfilador() -> Perfilador:
+    """Activar el registro de spans para el resto del proceso"""
+    _perfilador.activo = True
+    return _perfilador
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Pipeline de varias pestañas dentro de un mismo Chrome
+Mientras una pestaña espera la respuesta del sitio, las demás avanzan con su formulario
+"""
+
+import time
+import logging
+from typing import Any, Callable, Generator, Iterable, Iterator, Tuple
+
+from selenium.common.exceptions import TimeoutException
+
+# Script para navegar sin bloquear (driver.get espera la carga completa de la página)
+# Si el destino solo difiere en el #fragmento (rutas hash de Angular, o la misma URL otra vez)
+# asignar href no recarga el documento: se fuerza con reload() para que la marca desaparezca
+SCRIPT_NAVEGAR = (
+    "window.__pipeline_nav = true;"
+    "var destino = new URL(arguments[0], window.location.href);"
+    "var actual = new URL(window.location.href);"
+    "destino.hash = ''; actual.hash = '';"
+    "window.location.href = arguments[0];"
+    "if (destino.href === actual.href) { window.location.reload(); }"
+)
+# Verdadero cuando ya cargó el documento nuevo (la marca desaparece al cambiar de página)
+SCRIPT_PAGINA_NUEVA = "return window.__pipeline_nav === undefined && document.readyState === 'complete';"
+
+
+class Esperar:
+    """Condición que cede una tarea: se reanuda cuando condicion(driver) es verdadera"""
+
+    # Si la condición necesita que el driver esté en la pestaña de la tarea
+    usa_pestana = True
+
+    def __init__(self, condicion: Callable, timeout: float = 10, nombre: str = ""):
+        self.condicion = condicion
+        self.limite = time.monotonic() + timeout
+        self.nombre = nombre
+
+    def evaluar(self, driver) -> Any:
+        try:
+            return self.condicion(driver)
+        except Exception:
+            # Elemento todavía no disponible, página a medio cargar, etc.
+            return None
+
+
+class Pausa(Esperar):
+    """Pausa que no bloquea a las demás pestañas"""
+
+    usa_pestana = False
+
+    def __init__(self, segundos: float):
+        hasta = time.monotonic() + segundos
+        super().__init__(lambda driver: time.monotonic() >= hasta, timeout=segundos + 60, nombre="pausa")
+
+
+def pagina_nueva(driver) -> bool:
+    return driver.execute_script(SCRIPT_PAGINA_NUEVA)
+
+
+def verificar_recargas(driver, url: str, veces: int = 2, timeout: float = 30) -> bool:
+    """
+    Navegar varias veces seguidas a url en la pestaña actual con SCRIPT_NAVEGAR
+    True si cada navegación cargó un documento nuevo (lo que necesita la siguiente consulta de la pestaña)
+    """
+    for _ in range(veces):
+        driver.execute_script(SCRIPT_NAVEGAR, url)
+        limite = time.monotonic() + timeout
+        while not Esperar(pagina_nueva).evaluar(driver):
+            if time.monotonic() > limite:
+                return False
+            time.sleep(0.1)
+    return True
+
+
+# Una tarea es un generador que cede Esperar/Pausa y retorna el resultado
+Tarea = Generator[Esperar, Any, Any]
+
+
+class PipelinePestanas:
+    """
+    Planificador round-robin de tareas sobre varias pestañas de un mismo driver
+
+    Cada pestaña ejecuta una tarea a la vez. En cada vuelta se revisan las pestañas
+    y solo se avanza la tarea cuya condición ya está lista (por ejemplo, apareció el
+    resultado); las que siguen esperando no bloquean a las demás.
+    """
+
+    def __init__(self, driver, pestanas: int = 3, intervalo: float = 0.1):
+        self.driver = driver
+        self.pestanas = max(pestanas, 1)
+        self.intervalo = intervalo
+        self.logger = logging.getLogger(__name__)
+        self._actual = None
+
+    def _cambiar(self, handle):
+        """Cambiar de pestaña solo si hace falta (cada cambio es un round-trip a chromedriver)"""
+        if handle != self._actual:
+            self.driver.switch_to.window(handle)
+            self._actual = handle
+
+    def _abrir_pestanas(self) -> list:
+        handles = [self.driver.current_window_handle]
+        while len(handles) < self.pestanas:
+            self.driver.switch_to.new_window('tab')
+            handles.append(self.driver.current_window_handle)
+        self._actual = handles[-1]
+        return handles
+
+    def _cerrar_pestanas(self, handles: list):
+        for handle in handles[1:]:
+            try:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+            except Exception:
+                pass
+        self.driver.switch_to.window(handles[0])
+        self._actual = handles[0]
+
+    def _avanzar(self, tarea: Tarea, valor=None, error: Exception = None):
+        """Avanzar una tarea; retorna (terminada, siguiente_espera_o_resultado)"""
+        try:
+            if error is not None:
+                return False, tarea.throw(error)
+            return False, tarea.send(valor)
+        except StopIteration as fin:
+            return True, fin.value
+
+    def ejecutar(self, tareas: Iterable[Tuple[Any, Callable[[], Tarea]]]) -> Iterator[Tuple[Any, Any]]:
+        """
+        Ejecutar tareas repartidas entre las pestañas
+
+        Args:
+            tareas: Iterable de (clave, fabrica) donde fabrica() crea el generador de la tarea
+
+        Yields:
+            (clave, resultado) en el orden en que terminan
+        """
+        pendientes = iter(tareas)
+        handles = self._abrir_pestanas()
+        # handle -> [clave, tarea, espera_actual]
+        activas = {}
+
+        try:
+            while True:
+                # Asignar tareas nuevas a pestañas libres
+                for handle in handles:
+                    if handle in activas:
+                        continue
+                    siguiente = next(pendientes, None)
+                    if siguiente is None:
+                        break
+                    clave, fabrica = siguiente
+                    self._cambiar(handle)
+                    tarea = fabrica()
+                    terminada, espera = self._avanzar_seguro(tarea)
+                    if terminada:
+                        yield clave, espera
+                    else:
+                        activas[handle] = [clave, tarea, espera]
+
+                if not activas:
+                    return
+
+                hubo_avance = False
+                for handle in list(activas):
+                    clave, tarea, espera = activas[handle]
+                    if espera.usa_pestana:
+                        self._cambiar(handle)
+
+                    valor = espera.evaluar(self.driver)
+                    if valor or time.monotonic() > espera.limite:
+                        self._cambiar(handle)
+                    if valor:
+                        terminada, resultado = self._avanzar_seguro(tarea, valor=valor)
+                    elif time.monotonic() > espera.limite:
+                        terminada, resultado = self._avanzar_seguro(
+                            tarea, error=TimeoutException(f"Tiempo agotado esperando: {espera.nombre}")
+                        )
+                    else:
+                        continue
+
+                    hubo_avance = True
+                    if terminada:
+                        del activas[handle]
+                        yield clave, resultado
+                    else:
+                        activas[handle][2] = resultado
+
+                if not hubo_avance:
+                    time.sleep(self.intervalo)
+        finally:
+            for _, tarea, _ in activas.values():
+                tarea.close()
+            self._cerrar_pestanas(handles)
+
+    def _avanzar_seguro(self, tarea: Tarea, valor=None, error: Exception = None):
+        """Como _avanzar, pero un error no capturado por la tarea la termina con resultado None"""
+        try:
+            return self._avanzar(tarea, valor=valor, error=error)
+        except Exception as e:
+            self.logger.error(f"Error no controlado en tarea de pestaña: {e}")
+            return True, None
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Planificador de consultas con prioridades para el web service
+Las consultas interactivas (un DNI) pasan delante de las filas de los lotes,
+los lotes activos se reparten los navegadores de forma equitativa y cada lote
+tiene un límite de consultas simultáneas
+"""
+
+import time
+import logging
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FuturoTimeout
+from typing import Any, Callable, Iterable, Optional
+
+# Clases de prioridad (menor = más urgente)
+INTERACTIVA = 0
+LOTE = 1
+# Segundos que un lote terminado sigue consultable en trabajo() antes de descartarse
+RETENCION_LOTES = 3600
+
+_ids = itertools.count(1)
+
+
+class Trabajo:
+    """Conjunto de consultas enviadas juntas (un lote o una consulta interactiva)"""
+
+    def __init__(self, items: Iterable, prioridad: int = LOTE, max_concurrencia: int = 1, nombre: str = ""):
+        self.id = next(_ids)
+        self.nombre = nombre or f"trabajo-{self.id}"
+        self.prioridad = prioridad
+        self.max_concurrencia = max(max_concurrencia, 1)
+        self.items = list(items)
+        self.futuros = [Future() for _ in self.items]
+        self.pendientes = deque(zip(self.items, self.futuros))
+        self.total = len(self.futuros)
+        self.en_curso = 0
+        self.completados = 0
+        self.errores = 0
+        # Consultas atendidas según el reparto equitativo (tiempo virtual)
+        self.servido = 0
+        self.creado = time.time()
+        self.terminado_en = None
+
+    @property
+    def terminado(self) -> bool:
+        return self.completados >= self.total
+
+    def estado(self) -> dict:
+        return {
+            "id": self.id,
+            "nombre": self.nombre,
+            "prioridad": "interactiva" if self.prioridad == INTERACTIVA else "lote",
+            "total": self.total,
+            "completados": self.completados,
+            "en_curso": self.en_curso,
+            "pendientes": len(self.pendientes),
+            "errores": self.errores,
+            "max_concurrencia": self.max_concurrencia,
+            "terminado": self.terminado,
+        }
+
+
+class Planificador:
+    """
+    Trabajadores con un recurso propio cada uno (un scraper con su navegador)
+    que toman la siguiente consulta según prioridad:
+
+    1. Consultas interactivas, en orden de llegada
+    2. Filas de lotes: el lote con menos consultas atendidas entre los que no
+       llegaron a su max_concurrencia (reparto equitativo entre lotes)
+
+    Los trabajadores reservados solo atienden consultas interactivas, de modo que
+    un lote grande no deja sin navegador libre a las consultas de un DNI.
+    """
+
+    def __init__(self, ejecutar: Callable[[Any, Any], Any], crear_recurso: Callable[[], Any],
+                 trabajadores: int = 2, reserva_interactiva: int = 1, delay: float = 0,
+                 cerrar_recurso: Optional[Callable[[Any], None]] = None, retencion_lotes: float = RETENCION_LOTES):
+        """
+        Args:
+            ejecutar: ejecutar(recurso, item) -> resultado de una consulta
+            crear_recurso: Crea el recurso de un trabajador (se llama al recibir su primera consulta)
+            trabajadores: Cantidad de trabajadores (navegadores)
+            reserva_interactiva: Trabajadores que no atienden lotes (siempre queda al menos uno para lotes)
+            delay: Segundos de pausa de cada trabajador entre dos filas de lote
+            cerrar_recurso: Liberar un recurso (por defecto recurso.close())
+            retencion_lotes: Segundos que se conservan los resultados de un lote terminado
+        """
+        self.ejecutar = ejecutar
+        self.crear_recurso = crear_recurso
+        self.cerrar_recurso = cerrar_recurso or (lambda recurso: recurso.close())
+        self.delay = delay
+        self.retencion_lotes = retencion_lotes
+        self.logger = logging.getLogger(__name__)
+
+        self._condicion = threading.Condition()
+        self._interactivas = deque()
+        self._lotes = []
+        self._trabajos = {}
+        self._cerrado = False
+
+        trabajadores = max(trabajadores, 1)
+        reserva = min(max(reserva_interactiva, 0), trabajadores - 1)
+        self._hilos = []
+        for indice in range(trabajadores):
+            hilo = threading.Thread(
+                target=self._trabajador, args=(indice, indice < reserva),
+                name=f"planificador-{indice}", daemon=True
+            )
+            hilo.start()
+            self._hilos.append(hilo)
+
+    # --- Envío de trabajos ---
+
+    def consultar(self, item, timeout: Optional[float] = None):
+        """
+        Consulta interactiva: espera y retorna el resultado (lanza TimeoutError si no llega)
+        Si se agota el tiempo y la consulta todavía no empezó, se saca de la cola:
+        nadie espera ya su resultado
+        """
+        trabajo = Trabajo([item], prioridad=INTERACTIVA, nombre=f"consulta-{item}")
+        with self._condicion:
+            self._verificar_abierto()
+            self._trabajos[trabajo.id] = trabajo
+            self._interactivas.append(trabajo)
+            self._condicion.notify()
+        futuro = trabajo.futuros[0]
+        try:
+            return futuro.result(timeout=timeout)
+        except FuturoTimeout:
+            with self._condicion:
+                # Si ya está en curso no se puede cancelar: _terminar la descarta al terminar
+                if futuro.cancel():
+                    trabajo.pendientes.clear()
+                    self._descartar_si_termino(trabajo)
+                    self._trabajos.pop(trabajo.id, None)
+            raise
+
+    def enviar_lote(self, items: Iterable, max_concurrencia: int = 1, nombre: str = "") -> Trabajo:
+        """Encolar un lote; los resultados quedan en trabajo.futuros (mismo orden que items)"""
+        trabajo = Trabajo(items, prioridad=LOTE, max_concurrencia=max_concurrencia, nombre=nombre)
+        with self._condicion:
+            self._verificar_abierto()
+            # Un lote nuevo arranca a la par del menos atendido para no desplazar a los que ya corren
+            activos = [lote.servido for lote in self._lotes]
+            trabajo.servido = min(activos) if activos else 0
+            self._purgar_lotes()
+            self._trabajos[trabajo.id] = trabajo
+            self._lotes.append(trabajo)
+            self._condicion.notify_all()
+        self.logger.info(f"Lote {trabajo.nombre} encolado: {trabajo.total} consultas "
+                         f"(máx. {trabajo.max_concurrencia} simultáneas)")
+        return trabajo
+
+    def cancelar(self, id_trabajo: int) -> bool:
+        """Descartar las consultas pendientes de un trabajo (las que están en curso terminan)"""
+        with self._condicion:
+            trabajo = self._trabajos.get(id_trabajo)
+            if trabajo is None:
+                return False
+            while trabajo.pendientes:
+                _, futuro = trabajo.pendientes.popleft()
+                futuro.cancel()
+                trabajo.completados += 1
+            self._descartar_si_termino(trabajo)
+            self._marcar_fin(trabajo)
+            return True
+
+    def trabajo(self, id_trabajo: int) -> Optional[Trabajo]:
+        with self._condicion:
+            self._purgar_lotes()
+            return self._trabajos.get(id_trabajo)
+
+    def estado(self) -> dict:
+        with self._condicion:
+            self._purgar_lotes()
+            return {
+                "trabajadores": len(self._hilos),
+                "interactivas_en_cola": len(self._interactivas),
+                "lotes": [lote.estado() for lote in self._lotes],
+            }
+
+    def cerrar(self):
+        """Detener los trabajadores (cada uno cierra su recurso al salir)"""
+        with self._condicion:
+            self._cerrado = True
+            self._condicion.notify_all()
+        for hilo in self._hilos:
+            hilo.join()
+
+    # --- Trabajadores ---
+
+    def _verificar_abierto(self):
+        if self._cerrado:
+            raise RuntimeError("El planificador está cerrado")
+
+    def _descartar_si_termino(self, trabajo: Trabajo):
+        if trabajo.pendientes:
+            return
+        if trabajo in self._lotes:
+            self._lotes.remove(trabajo)
+        if trabajo.prioridad == INTERACTIVA and trabajo in self._interactivas:
+            self._interactivas.remove(trabajo)
+
+    def _marcar_fin(self, trabajo: Trabajo):
+        if trabajo.terminado and trabajo.terminado_en is None:
+            trabajo.terminado_en = time.time()
+
+    def _purgar_lotes(self):
+        """Olvidar los lotes terminados hace más de retencion_lotes (sus futuros guardan todos los resultados)"""
+        limite = time.time() - self.retencion_lotes
+        vencidos = [
+            id_trabajo for id_trabajo, trabajo in self._trabajos.items()
+            if trabajo.prioridad == LOTE and trabajo.terminado_en is not None and trabajo.terminado_en < limite
+        ]
+        for id_trabajo in vencidos:
+            del self._trabajos[id_trabajo]
+
+    def _siguiente_lote(self) -> Optional[Trabajo]:
+        candidatos = [
+            lote for lote in self._lotes
+            if lote.pendientes and lote.en_curso < lote.max_concurrencia
+        ]
+        if not candidatos:
+            return None
+        return min(candidatos, key=lambda lote: (lote.servido, lote.id))
+
+    def _tomar(self, reservado: bool, lote_desde: float):
+        """Esperar la siguiente consulta para un trabajador; None si el planificador se cerró"""
+        with self._condicion:
+            while not self._cerrado:
+                if self._interactivas:
+                    trabajo = self._interactivas[0]
+                else:
+                    trabajo = None
+                    espera = None
+                    if not reservado:
+                        espera = lote_desde - time.monotonic()
+                        if espera <= 0:
+                            trabajo = self._siguiente_lote()
+                    if trabajo is None:
+                        # Una consulta interactiva nueva despierta al trabajador antes de que termine la pausa
+                        self._condicion.wait(timeout=espera if espera and espera > 0 else None)
+                        continue
+
+                item, futuro = trabajo.pendientes.popleft()
+                trabajo.en_curso += 1
+                trabajo.servido += 1
+                self._descartar_si_termino(trabajo)
+                if futuro.set_running_or_notify_cancel():
+                    return trabajo, item, futuro
+                trabajo.en_curso -= 1
+                trabajo.completados += 1
+                self._marcar_fin(trabajo)
+            return None
+
+    def _terminar(self, trabajo: Trabajo, error: bool):
+        with self._condicion:
+            trabajo.en_curso -= 1
+            trabajo.completados += 1
+            if error:
+                trabajo.errores += 1
+            self._marcar_fin(trabajo)
+            if trabajo.prioridad == INTERACTIVA:
+                self._trabajos.pop(trabajo.id, None)
+            # Se liberó un cupo del lote
+            self._condicion.notify_all()
+
+    def _trabajador(self, indice: int, reservado: bool):
+        recurso = None
+        lote_desde = 0.0
+        try:
+            while True:
+                siguiente = self._tomar(reservado, lote_desde)
+                if siguiente is None:
+                    return
+                trabajo, item, futuro = siguiente
+
+                try:
+                    if recurso is None:
+                        recurso = self.crear_recurso()
+                    resultado = self.ejecutar(recurso, item)
+                except Exception as e:
+                    self.logger.error(f"Error en trabajador {indice} con {item}: {e}")
+                    futuro.set_exception(e)
+                    self._terminar(trabajo, error=True)
+                    # El recurso puede haber quedado inutilizable (navegador caído): se recrea
+                    recurso = self._liberar(recurso)
+                else:
+                    futuro.set_result(resultado)
+                    self._terminar(trabajo, error=False)
+
+                if trabajo.prioridad == LOTE:
+                    lote_desde = time.monotonic() + self.delay
+        finally:
+            self._liberar(recurso)
+
+    def _liberar(self, recurso):
+        if recurso is not None:
+            try:
+                self.cerrar_recurso(recurso)
+            except Exception as e:
+                self.logger.warning(f"Error cerrando recurso: {e}")
+        return None
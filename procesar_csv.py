@@ -10,17 +10,18 @@ import logging
 from dni_scraper import DNIScraper
 import re
 from pathlib import Path
+from configuracion_logs import configurar_logging
+from archivo_respuestas import SITIO_ELDNI, valor_sin_resultado
+from incremental import aplicar_incremental, imprimir_diferencias
+from estimador import EtaEnVivo, planificar
+from corrida import Corrida, agregar_opciones
 
-def setup_logging():
-    """Configurar logging"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('dni_procesamiento.log', encoding='utf-8'),
-            logging.StreamHandler()
-        ]
-    )
+# El código verificador depende solo del DNI: no hay otras columnas en la huella de la fila
+COLUMNAS_HUELLA = ()
+
+def setup_logging(muestreo=None):
+    """Configurar logging (JSON estructurado, no bloqueante)"""
+    configurar_logging('dni_procesamiento.log', muestreo=muestreo)
     return logging.getLogger(__name__)
 
 def limpiar_dni(dni_str):
@@ -44,7 +45,56 @@ def limpiar_dni(dni_str):
     
     return None
 
-def procesar_csv_dnis(archivo_csv, inicio_desde=0, cantidad_procesar=None, delay=3):
+def procesar_con_pestanas(scraper, df, dni_column, filas, pestanas, logger, eta=None):
+    """
+    Procesar las filas indicadas con varias pestañas del mismo Chrome
+    Los DNIs repetidos se consultan una sola vez
+    Retorna (procesados, exitosos, consultas al sitio)
+    """
+    procesados = 0
+    exitosos = 0
+    filas_por_dni = {}
+    
+    for i in filas:
+        dni_raw = df.iloc[i][dni_column]
+        dni_limpio = limpiar_dni(dni_raw)
+        if not dni_limpio:
+            logger.warning(f"DNI inválido en fila {i + 1}: {dni_raw}")
+            df.at[i, 'CODIGO_VERIFICADOR'] = 'DNI_INVALIDO'
+            procesados += 1
+            continue
+        filas_por_dni.setdefault(dni_limpio, []).append(i)
+    
+    logger.info(f"Consultando {len(filas_por_dni)} DNIs únicos con {pestanas} pestañas")
+    
+    eta = eta or EtaEnVivo(len(filas_por_dni))
+    for dni_limpio, codigo, _, _ in scraper.iter_codigos_verificadores(list(filas_por_dni), pestanas=pestanas):
+        filas_dni = filas_por_dni[dni_limpio]
+        for i in filas_dni:
+            df.at[i, 'CODIGO_VERIFICADOR'] = codigo or valor_sin_resultado(SITIO_ELDNI, dni_limpio)
+        
+        if codigo:
+            logger.info(f"[OK] DNI {dni_limpio} -> Código: {codigo}")
+            exitosos += len(filas_dni)
+        else:
+            logger.warning(f"[ERROR] No se encontró código para DNI: {dni_limpio}")
+        
+        antes = procesados
+        procesados += len(filas_dni)
+        eta.avanzar()
+        logger.info(f"Procesados {procesados}/{len(filas)} ({eta.texto()})",
+                    extra={'dni': dni_limpio, 'fila': procesados, 'total': len(filas),
+                           'eta': eta.segundos_restantes})
+        
+        # Guardar progreso cada 100 registros
+        if procesados // 100 > antes // 100:
+            nombre_temporal = f"automate_progreso_{procesados}.csv"
+            df.to_csv(nombre_temporal, index=False)
+            logger.info(f"Progreso guardado en: {nombre_temporal}")
+    
+    return procesados, exitosos, len(filas_por_dni)
+
+def procesar_csv_dnis(archivo_csv, inicio_desde=0, cantidad_procesar=None, delay=3, log_muestreo=None, perfil=None, pestanas=1, incremental=None, grabar=None, reproducir=None):
     """
     Procesar DNIs desde CSV y crear nuevo CSV con códigos verificadores
     
@@ -53,8 +103,19 @@ def procesar_csv_dnis(archivo_csv, inicio_desde=0, cantidad_procesar=None, delay
         inicio_desde: Fila desde donde iniciar (0 = primera fila de datos)
         cantidad_procesar: Cantidad de DNIs a procesar (None = todos)
         delay: Segundos entre requests
+        log_muestreo: Fracción de DNIs con mensajes por paso en el log (None = LOG_MUESTREO o 0.1)
+        perfil: Archivo donde guardar la traza de tiempos en formato Chrome trace (None = no perfilar)
+        pestanas: Consultas simultáneas en pestañas del mismo Chrome (1 = secuencial)
+        incremental: Salida anterior (automate_con_codigos_*.csv) cuyos códigos se reutilizan en filas sin cambios
+        grabar: Archivo SQLite donde guardar las páginas de resultado de elDNI.com de cada DNI
+        reproducir: Archivo SQLite grabado antes; se extrae de ahí sin abrir Chrome ni esperar
     """
-    logger = setup_logging()
+    logger = setup_logging(log_muestreo)
+    corrida = Corrida('codigos', delay, pestanas, perfil, grabar, reproducir)
+    if not corrida.preparar(logger):
+        return
+    delay = corrida.delay
+    perfilador = corrida.perfilador
     
     # Verificar que existe el archivo
     if not Path(archivo_csv).exists():
@@ -92,60 +153,87 @@ def procesar_csv_dnis(archivo_csv, inicio_desde=0, cantidad_procesar=None, delay
     
     logger.info(f"Procesando desde fila {inicio_desde} hasta {fin-1} (total: {fin-inicio_desde} registros)")
     
+    # Reutilizar los códigos de la corrida anterior en las filas sin cambios
+    reutilizadas = pd.Series(False, index=df.index)
+    resumen_incremental = None
+    if incremental:
+        try:
+            reutilizadas, resumen_incremental = aplicar_incremental(
+                df, incremental, dni_column, 'CODIGO_VERIFICADOR', COLUMNAS_HUELLA
+            )
+        except (OSError, ValueError) as e:
+            logger.error(f"No se pudo usar la salida anterior: {e}")
+            return
+    filas = [i for i in range(inicio_desde, fin) if not reutilizadas.iloc[i]]
+    if incremental:
+        logger.info(f"Filas a consultar: {len(filas)} (reutilizadas en el rango: {fin - inicio_desde - len(filas)})")
+    
     # Inicializar scraper
+    corrida.iniciar_consultas()
     try:
         with DNIScraper(headless=True, delay=delay) as scraper:
             procesados = 0
             exitosos = 0
             
-            # Procesar cada fila en el rango especificado
-            for i in range(inicio_desde, fin):
-                fila_actual = i + 1  # +1 porque el CSV tiene header
-                dni_raw = df.iloc[i][dni_column]
-                dni_limpio = limpiar_dni(dni_raw)
+            if pestanas > 1:
+                procesados, exitosos, consultas = procesar_con_pestanas(scraper, df, dni_column, filas, pestanas, logger)
+            else:
+                consultas = sum(1 for i in filas if limpiar_dni(df.iloc[i][dni_column]))
+                eta = EtaEnVivo(len(filas))
+                # Procesar cada fila en el rango especificado
+                for n, i in enumerate(filas):
+                    fila_actual = i + 1  # +1 porque el CSV tiene header
+                    dni_raw = df.iloc[i][dni_column]
+                    dni_limpio = limpiar_dni(dni_raw)
+                    eta.actualizar(n)
                 
-                logger.info(f"Procesando fila {fila_actual}/{total_filas}: {dni_raw}")
+                    logger.info(f"Procesando fila {fila_actual}/{total_filas}: {dni_raw} ({eta.texto()})",
+                                extra={'dni': dni_limpio, 'fila': fila_actual, 'total': total_filas,
+                                       'eta': eta.segundos_restantes})
                 
-                if not dni_limpio:
-                    logger.warning(f"DNI inválido en fila {fila_actual}: {dni_raw}")
-                    df.at[i, 'CODIGO_VERIFICADOR'] = 'DNI_INVALIDO'
-                    procesados += 1
-                    continue
+                    if not dni_limpio:
+                        logger.warning(f"DNI inválido en fila {fila_actual}: {dni_raw}")
+                        df.at[i, 'CODIGO_VERIFICADOR'] = 'DNI_INVALIDO'
+                        procesados += 1
+                        continue
                 
-                try:
-                    # Obtener código verificador
-                    codigo, _, _ = scraper.get_codigo_verificador(dni_limpio)
+                    try:
+                        # Obtener código verificador
+                        codigo, _, _ = scraper.get_codigo_verificador(dni_limpio)
                     
-                    if codigo:
-                        df.at[i, 'CODIGO_VERIFICADOR'] = codigo
-                        logger.info(f"[OK] DNI {dni_limpio} -> Código: {codigo}")
-                        exitosos += 1
-                    else:
-                        df.at[i, 'CODIGO_VERIFICADOR'] = 'NO_ENCONTRADO'
-                        logger.warning(f"[ERROR] No se encontró código para DNI: {dni_limpio}")
+                        if codigo:
+                            df.at[i, 'CODIGO_VERIFICADOR'] = codigo
+                            logger.info(f"[OK] DNI {dni_limpio} -> Código: {codigo}")
+                            exitosos += 1
+                        else:
+                            df.at[i, 'CODIGO_VERIFICADOR'] = valor_sin_resultado(SITIO_ELDNI, dni_limpio)
+                            logger.warning(f"[ERROR] No se encontró código para DNI: {dni_limpio}")
                     
-                    procesados += 1
+                        procesados += 1
                     
-                    # Guardar progreso cada 100 registros
-                    if procesados % 100 == 0:
-                        nombre_temporal = f"automate_progreso_{procesados}.csv"
-                        df.to_csv(nombre_temporal, index=False)
-                        logger.info(f"Progreso guardado en: {nombre_temporal}")
+                        # Guardar progreso cada 100 registros
+                        if procesados % 100 == 0:
+                            nombre_temporal = f"automate_progreso_{procesados}.csv"
+                            df.to_csv(nombre_temporal, index=False)
+                            logger.info(f"Progreso guardado en: {nombre_temporal}")
                     
-                    # Pausa entre requests
-                    if i < fin - 1:  # No hacer pausa en el último
-                        logger.info(f"Esperando {delay} segundos...")
-                        time.sleep(delay)
+                        # Pausa entre requests
+                        if i != filas[-1]:  # No hacer pausa en el último
+                            logger.info(f"Esperando {delay} segundos...", extra={'dni': dni_limpio, 'stage': 'espera'})
+                            with perfilador.span("pausa_entre_requests", dni_limpio, categoria="sleep"):
+                                time.sleep(delay)
                 
-                except Exception as e:
-                    logger.error(f"Error procesando DNI {dni_limpio}: {e}")
-                    df.at[i, 'CODIGO_VERIFICADOR'] = 'ERROR'
-                    procesados += 1
+                    except Exception as e:
+                        logger.error(f"Error procesando DNI {dni_limpio}: {e}")
+                        df.at[i, 'CODIGO_VERIFICADOR'] = 'ERROR'
+                        procesados += 1
     
     except Exception as e:
         logger.error(f"Error con el scraper: {e}")
         return
     
+    corrida.registrar(consultas)
+    
     # Guardar CSV final
     nombre_final = f"automate_con_codigos_{inicio_desde}_{fin}.csv"
     df.to_csv(nombre_final, index=False)
@@ -157,9 +245,15 @@ def procesar_csv_dnis(archivo_csv, inicio_desde=0, cantidad_procesar=None, delay
     print(f"Total registros procesados: {procesados}")
     print(f"Códigos obtenidos exitosamente: {exitosos}")
     print(f"Errores/No encontrados: {procesados - exitosos}")
+    if resumen_incremental:
+        imprimir_diferencias(resumen_incremental)
     print(f"Archivo final guardado: {nombre_final}")
     print(f"{'='*50}")
     
+    if perfil:
+        perfilador.guardar_chrome_trace(perfil)
+        perfilador.imprimir_resumen("get_codigo_verificador")
+    
     return nombre_final
 
 def main():
@@ -171,9 +265,22 @@ def main():
     parser.add_argument('--inicio', '-i', type=int, default=0, help='Fila desde donde iniciar (0 = primera)')
     parser.add_argument('--cantidad', '-c', type=int, help='Cantidad de registros a procesar')
     parser.add_argument('--delay', '-d', type=int, default=1, help='Segundos entre requests')
+    parser.add_argument('--pestanas', '-p', type=int, default=1, help='Consultas simultáneas en pestañas del mismo Chrome')
+    parser.add_argument('--log-muestreo', type=float, help='Fracción de DNIs con mensajes por paso en el log (0-1, default 0.1)')
+    parser.add_argument('--profile', metavar='ARCHIVO', help='Guardar traza de tiempos por DNI en formato Chrome trace / Perfetto (JSON)')
+    parser.add_argument('--incremental', metavar='SALIDA_ANTERIOR', help='Reutilizar los códigos de una salida anterior y consultar solo filas nuevas o cambiadas')
+    agregar_opciones(parser)
     
     args = parser.parse_args()
     
+    if args.plan:
+        try:
+            planificar(args.archivo, 'codigos', args.delay, args.pestanas, args.plazo, args.inicio, args.cantidad,
+                       args.incremental, COLUMNAS_HUELLA, args.reproducir)
+        except (OSError, ValueError) as e:
+            setup_logging().error(f"No se pudo planificar la corrida: {e}")
+        return
+    
     print("Iniciando procesamiento de DNIs desde CSV...")
     print(f"Archivo: {args.archivo}")
     print(f"Inicio desde fila: {args.inicio}")
@@ -185,7 +292,13 @@ def main():
         archivo_csv=args.archivo,
         inicio_desde=args.inicio,
         cantidad_procesar=args.cantidad,
-        delay=args.delay
+        delay=args.delay,
+        log_muestreo=args.log_muestreo,
+        perfil=args.profile,
+        incremental=args.incremental,
+        grabar=args.grabar,
+        reproducir=args.reproducir,
+        pestanas=args.pestanas
     )
 
 if __name__ == "__main__":
@@ -10,17 +10,19 @@ import logging
 from congreso_scraper import CongresoScraper
 import re
 from pathlib import Path
+from configuracion_logs import configurar_logging
+from archivo_respuestas import SIN_GRABACION, SITIO_CONGRESO, valor_sin_resultado
+from ubigeo_local import COLUMNA_UBICACION, resolver_ubigeos_locales
+from incremental import aplicar_incremental, imprimir_diferencias
+from estimador import EtaEnVivo, planificar
+from corrida import Corrida, agregar_opciones
 
-def setup_logging():
-    """Configurar logging"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('ubigeos_procesamiento.log', encoding='utf-8'),
-            logging.StreamHandler()
-        ]
-    )
+# Un cambio de código verificador o de dirección invalida el ubigeo anterior
+COLUMNAS_HUELLA = ('CODIGO_VERIFICADOR', COLUMNA_UBICACION)
+
+def setup_logging(muestreo=None):
+    """Configurar logging (JSON estructurado, no bloqueante)"""
+    configurar_logging('ubigeos_procesamiento.log', muestreo=muestreo)
     return logging.getLogger(__name__)
 
 def limpiar_dni(dni_str):
@@ -44,7 +46,81 @@ def limpiar_dni(dni_str):
     
     return None
 
-def procesar_ubigeos(archivo_csv, inicio_desde=0, cantidad_procesar=None, delay=3):
+def limpiar_codigo_verificador(codigo_verificador_raw):
+    """Limpiar código verificador (quitar decimales si es número)"""
+    if pd.isna(codigo_verificador_raw):
+        return ''
+    if str(codigo_verificador_raw).replace('.', '').isdigit():
+        return str(int(float(codigo_verificador_raw)))
+    return str(codigo_verificador_raw).strip()
+
+def procesar_con_pestanas(df, df_validos, dni_column, inicio_desde, fin, pestanas, delay, logger):
+    """
+    Procesar el rango con un solo Chrome y varias pestañas en paralelo
+    (en lugar de un navegador nuevo por DNI)
+    Retorna (procesados, exitosos, consultas al portal)
+    """
+    procesados = 0
+    exitosos = 0
+    indices_por_dni = {}
+    consultas = []
+    
+    for i in range(inicio_desde, fin):
+        idx_original = df_validos.index[i]
+        row = df_validos.iloc[i]
+        dni_limpio = limpiar_dni(row[dni_column])
+        codigo_verificador = limpiar_codigo_verificador(row['CODIGO_VERIFICADOR'])
+        
+        if not dni_limpio:
+            logger.warning(f"DNI inválido en registro {i+1}: {row[dni_column]}")
+            df.at[idx_original, 'UBIGEO'] = 'DNI_INVALIDO'
+            procesados += 1
+            continue
+        if not codigo_verificador or codigo_verificador in ['DNI_INVALIDO', 'NO_ENCONTRADO', 'ERROR', SIN_GRABACION]:
+            logger.warning(f"Código verificador inválido para DNI {dni_limpio}: {codigo_verificador}")
+            df.at[idx_original, 'UBIGEO'] = 'SIN_CODIGO_VALIDO'
+            procesados += 1
+            continue
+        
+        if dni_limpio not in indices_por_dni:
+            consultas.append((dni_limpio, codigo_verificador))
+        indices_por_dni.setdefault(dni_limpio, []).append(idx_original)
+    
+    if not consultas:
+        # Todo el rango quedó resuelto o descartado: no hace falta abrir Chrome
+        logger.info("No quedan DNIs para consultar en el portal del Congreso")
+        return procesados, exitosos, 0
+    
+    logger.info(f"Consultando {len(consultas)} DNIs únicos con {pestanas} pestañas")
+    
+    eta = EtaEnVivo(len(consultas))
+    with CongresoScraper(headless=True, delay=delay) as scraper:
+        for dni_limpio, ubigeo in scraper.iter_ubigeos(consultas, pestanas=pestanas):
+            indices = indices_por_dni[dni_limpio]
+            df.loc[indices, 'UBIGEO'] = ubigeo or valor_sin_resultado(SITIO_CONGRESO, dni_limpio)
+            
+            if ubigeo:
+                logger.info(f"[OK] DNI {dni_limpio} -> Ubigeo: {ubigeo}")
+                exitosos += len(indices)
+            else:
+                logger.warning(f"[ERROR] No se encontró ubigeo para DNI: {dni_limpio}")
+            
+            antes = procesados
+            procesados += len(indices)
+            eta.avanzar()
+            logger.info(f"Procesados {procesados}/{fin - inicio_desde} ({eta.texto()})",
+                        extra={'dni': dni_limpio, 'fila': inicio_desde + procesados, 'total': len(df_validos),
+                               'eta': eta.segundos_restantes})
+            
+            # Guardar progreso cada 5 registros
+            if procesados // 5 > antes // 5:
+                nombre_temporal = f"ubigeos_progreso_{procesados}.csv"
+                df.to_csv(nombre_temporal, index=False)
+                logger.info(f"Progreso guardado en: {nombre_temporal}")
+    
+    return procesados, exitosos, len(consultas)
+
+def procesar_ubigeos(archivo_csv, inicio_desde=0, cantidad_procesar=None, delay=3, log_muestreo=None, perfil=None, ubigeo_local=True, pestanas=1, incremental=None, grabar=None, reproducir=None):
     """
     Procesar ubigeos desde CSV que ya tiene códigos verificadores
     
@@ -53,8 +129,20 @@ def procesar_ubigeos(archivo_csv, inicio_desde=0, cantidad_procesar=None, delay=
         inicio_desde: Fila desde donde iniciar (0 = primera fila de datos)
         cantidad_procesar: Cantidad de DNIs a procesar (None = todos)
         delay: Segundos entre requests
+        log_muestreo: Fracción de DNIs con mensajes por paso en el log (None = LOG_MUESTREO o 0.1)
+        perfil: Archivo donde guardar la traza de tiempos en formato Chrome trace (None = no perfilar)
+        ubigeo_local: Resolver primero con el índice local de ubigeos (columna DEPART. / PROV/ DIST.)
+        pestanas: Consultas simultáneas en pestañas de un solo Chrome (1 = un navegador por DNI)
+        incremental: Salida anterior (ubigeos_completo_*.csv) cuyos ubigeos se reutilizan en filas sin cambios
+        grabar: Archivo SQLite donde guardar las respuestas de validación del Congreso de cada DNI
+        reproducir: Archivo SQLite de una corrida con grabar; los ubigeos salen de ahí, sin Chrome ni pausas
     """
-    logger = setup_logging()
+    logger = setup_logging(log_muestreo)
+    corrida = Corrida('ubigeos', delay, pestanas, perfil, grabar, reproducir)
+    if not corrida.preparar(logger):
+        return False
+    delay = corrida.delay
+    perfilador = corrida.perfilador
     
     # Verificar que existe el archivo
     if not Path(archivo_csv).exists():
@@ -89,18 +177,44 @@ def procesar_ubigeos(archivo_csv, inicio_desde=0, cantidad_procesar=None, delay=
     if 'UBIGEO' not in df.columns:
         df['UBIGEO'] = ''
     
-    # Filtrar solo registros con código verificador válido
+    # Resolver localmente los registros cuyo distrito ya está en la columna de ubicación
+    resueltos_local = pd.Series(False, index=df.index)
+    if ubigeo_local and COLUMNA_UBICACION in df.columns:
+        locales = resolver_ubigeos_locales(df)
+        resueltos_local = locales['UBIGEO'].notna()
+        df.loc[resueltos_local, 'UBIGEO'] = locales.loc[resueltos_local, 'UBIGEO']
+        conteo = locales['ESTADO'].value_counts().to_dict()
+        logger.info(f"Ubigeos resueltos localmente: {int(resueltos_local.sum())} "
+                    f"(exactos: {conteo.get('exacto', 0)}, aproximados: {conteo.get('aproximado', 0)}, "
+                    f"ambiguos: {conteo.get('ambiguo', 0)}, sin match: {conteo.get('sin_match', 0)})")
+    
+    # Reutilizar los ubigeos de la corrida anterior en las filas sin cambios (lo resuelto localmente tiene prioridad)
+    reutilizadas = pd.Series(False, index=df.index)
+    resumen_incremental = None
+    if incremental:
+        try:
+            reutilizadas, resumen_incremental = aplicar_incremental(
+                df, incremental, dni_column, 'UBIGEO', COLUMNAS_HUELLA, candidatas=~resueltos_local
+            )
+        except (OSError, ValueError) as e:
+            logger.error(f"No se pudo usar la salida anterior: {e}")
+            return False
+    
+    # Filtrar solo registros con código verificador válido que aún necesitan el portal del Congreso
     df_validos = df[
         (df['CODIGO_VERIFICADOR'].notna()) & 
         (df['CODIGO_VERIFICADOR'] != '') & 
         (df['CODIGO_VERIFICADOR'] != 'DNI_INVALIDO') & 
         (df['CODIGO_VERIFICADOR'] != 'NO_ENCONTRADO') &
-        (df['CODIGO_VERIFICADOR'] != 'ERROR')
+        (df['CODIGO_VERIFICADOR'] != 'ERROR') &
+        (df['CODIGO_VERIFICADOR'] != SIN_GRABACION) &
+        ~resueltos_local &
+        ~reutilizadas
     ].copy()
     
     logger.info(f"Registros con código verificador válido: {len(df_validos)}")
     
-    if len(df_validos) == 0:
+    if len(df_validos) == 0 and not (resueltos_local.any() or reutilizadas.any()):
         logger.error("No hay registros con códigos verificadores válidos para procesar")
         return False
     
@@ -112,25 +226,31 @@ def procesar_ubigeos(archivo_csv, inicio_desde=0, cantidad_procesar=None, delay=
     logger.info(f"Procesando desde registro {inicio_desde} hasta {fin-1} (total: {fin-inicio_desde} registros)")
     
     # Procesar cada DNI con scraper individual (más estable)
+    corrida.iniciar_consultas()
     try:
         procesados = 0
         exitosos = 0
         
-        # Procesar cada registro válido en el rango especificado
-        for i in range(inicio_desde, fin):
+        if pestanas > 1:
+            procesados, exitosos, consultas = procesar_con_pestanas(df, df_validos, dni_column, inicio_desde, fin,
+                                                                    pestanas, delay, logger)
+        else:
+            eta = EtaEnVivo(fin - inicio_desde)
+            # Procesar cada registro válido en el rango especificado
+            for i in range(inicio_desde, fin):
+                eta.actualizar(i - inicio_desde)
                 row = df_validos.iloc[i]
                 dni_raw = row[dni_column]
                 codigo_verificador_raw = row['CODIGO_VERIFICADOR']
                 
-                # Limpiar código verificador (quitar decimales si es número)
-                if pd.isna(codigo_verificador_raw):
-                    codigo_verificador = ''
-                else:
-                    codigo_verificador = str(int(float(codigo_verificador_raw))) if str(codigo_verificador_raw).replace('.', '').isdigit() else str(codigo_verificador_raw).strip()
+                codigo_verificador = limpiar_codigo_verificador(codigo_verificador_raw)
                 
                 dni_limpio = limpiar_dni(dni_raw)
                 
-                logger.info(f"Procesando registro {i+1}/{total_validos}: DNI {dni_raw} con código {codigo_verificador}")
+                logger.info(f"Procesando registro {i+1}/{total_validos}: DNI {dni_raw} con código {codigo_verificador} "
+                            f"({eta.texto()})",
+                            extra={'dni': dni_limpio, 'fila': i + 1, 'total': total_validos,
+                                   'eta': eta.segundos_restantes})
                 
                 if not dni_limpio:
                     logger.warning(f"DNI inválido en registro {i+1}: {dni_raw}")
@@ -140,7 +260,7 @@ def procesar_ubigeos(archivo_csv, inicio_desde=0, cantidad_procesar=None, delay=
                     procesados += 1
                     continue
                 
-                if not codigo_verificador or codigo_verificador in ['DNI_INVALIDO', 'NO_ENCONTRADO', 'ERROR']:
+                if not codigo_verificador or codigo_verificador in ['DNI_INVALIDO', 'NO_ENCONTRADO', 'ERROR', SIN_GRABACION]:
                     logger.warning(f"Código verificador inválido para DNI {dni_limpio}: {codigo_verificador}")
                     # Buscar el índice original en el DataFrame completo
                     idx_original = df[df[dni_column] == dni_raw].index[0]
@@ -161,7 +281,7 @@ def procesar_ubigeos(archivo_csv, inicio_desde=0, cantidad_procesar=None, delay=
                         logger.info(f"[OK] DNI {dni_limpio} -> Ubigeo: {ubigeo}")
                         exitosos += 1
                     else:
-                        df.at[idx_original, 'UBIGEO'] = 'NO_ENCONTRADO'
+                        df.at[idx_original, 'UBIGEO'] = valor_sin_resultado(SITIO_CONGRESO, dni_limpio)
                         logger.warning(f"[ERROR] No se encontró ubigeo para DNI: {dni_limpio}")
                     
                     procesados += 1
@@ -174,8 +294,9 @@ def procesar_ubigeos(archivo_csv, inicio_desde=0, cantidad_procesar=None, delay=
                     
                     # Pausa entre requests
                     if i < fin - 1:  # No hacer pausa en el último
-                        logger.info(f"Esperando {delay} segundos...")
-                        time.sleep(delay)
+                        logger.info(f"Esperando {delay} segundos...", extra={'dni': dni_limpio, 'stage': 'espera'})
+                        with perfilador.span("pausa_entre_requests", dni_limpio, categoria="sleep"):
+                            time.sleep(delay)
                 
                 except Exception as e:
                     logger.error(f"Error procesando DNI {dni_limpio}: {e}")
@@ -188,6 +309,13 @@ def procesar_ubigeos(archivo_csv, inicio_desde=0, cantidad_procesar=None, delay=
         logger.error(f"Error con el scraper del Congreso: {e}")
         return False
     
+    if not reproducir:
+        if pestanas <= 1:
+            # Secuencial: cada registro con DNI y código válidos es una consulta, aunque el DNI se repita
+            resultados = df.loc[df_validos.index[inicio_desde:fin], 'UBIGEO']
+            consultas = int((~resultados.isin(['DNI_INVALIDO', 'SIN_CODIGO_VALIDO'])).sum())
+        corrida.registrar(consultas)
+    
     # Guardar CSV final
     nombre_final = f"ubigeos_completo_{inicio_desde}_{fin}.csv"
     df.to_csv(nombre_final, index=False)
@@ -198,11 +326,18 @@ def procesar_ubigeos(archivo_csv, inicio_desde=0, cantidad_procesar=None, delay=
     print(f"{'='*60}")
     print(f"Total registros procesados: {procesados}")
     print(f"Ubigeos obtenidos exitosamente: {exitosos}")
+    print(f"Ubigeos resueltos localmente (sin Congreso): {int(resueltos_local.sum())}")
     print(f"Errores/No encontrados: {procesados - exitosos}")
+    if resumen_incremental:
+        imprimir_diferencias(resumen_incremental)
     print(f"Tasa de éxito: {(exitosos/max(procesados,1)*100):.1f}%")
     print(f"Archivo final guardado: {nombre_final}")
     print(f"{'='*60}")
     
+    if perfil:
+        perfilador.guardar_chrome_trace(perfil)
+        perfilador.imprimir_resumen("get_ubigeo")
+    
     return nombre_final
 
 def main():
@@ -214,9 +349,24 @@ def main():
     parser.add_argument('--inicio', '-i', type=int, default=0, help='Registro desde donde iniciar (0 = primero)')
     parser.add_argument('--cantidad', '-c', type=int, help='Cantidad de registros a procesar')
     parser.add_argument('--delay', '-d', type=int, default=3, help='Segundos entre requests')
+    parser.add_argument('--pestanas', '-p', type=int, default=1, help='Consultas simultáneas en pestañas de un solo Chrome')
+    parser.add_argument('--sin-ubigeo-local', action='store_true', help='Consultar todos los DNIs en el portal del Congreso')
+    parser.add_argument('--log-muestreo', type=float, help='Fracción de DNIs con mensajes por paso en el log (0-1, default 0.1)')
+    parser.add_argument('--profile', metavar='ARCHIVO', help='Guardar traza de tiempos por DNI en formato Chrome trace / Perfetto (JSON)')
+    parser.add_argument('--incremental', metavar='SALIDA_ANTERIOR', help='Reutilizar los ubigeos de una salida anterior y consultar solo filas nuevas o cambiadas')
+    agregar_opciones(parser)
     
     args = parser.parse_args()
     
+    if args.plan:
+        try:
+            planificar(args.archivo, 'ubigeos', args.delay, args.pestanas, args.plazo, args.inicio, args.cantidad,
+                       args.incremental, COLUMNAS_HUELLA, args.reproducir, not args.sin_ubigeo_local)
+        except (OSError, ValueError) as e:
+            setup_logging().error(f"No se pudo planificar la corrida: {e}")
+            print(f"\n❌ Error en el procesamiento")
+        return
+    
     print("🌍 Iniciando procesamiento de UBIGEOS...")
     print(f"Archivo: {args.archivo}")
     print(f"Inicio desde registro: {args.inicio}")
@@ -228,7 +378,14 @@ def main():
         archivo_csv=args.archivo,
         inicio_desde=args.inicio,
         cantidad_procesar=args.cantidad,
-        delay=args.delay
+        delay=args.delay,
+        log_muestreo=args.log_muestreo,
+        perfil=args.profile,
+        ubigeo_local=not args.sin_ubigeo_local,
+        pestanas=args.pestanas,
+        incremental=args.incremental,
+        grabar=args.grabar,
+        reproducir=args.reproducir
     )
     
     if resultado:
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Almacén compacto de resultados de DNIScraper
+Arreglos tipados en lugar de un dict por DNI: memoria constante por registro para lotes de millones
+"""
+
+from array import array
+from typing import Iterator, Optional, Tuple
+
+# Códigos de estado (un byte por registro)
+ESTADO_OK = 0
+ESTADO_NO_ENCONTRADO = 1
+ESTADO_DNI_INVALIDO = 2
+ESTADO_ERROR = 3
+NOMBRES_ESTADO = {
+    ESTADO_OK: 'OK',
+    ESTADO_NO_ENCONTRADO: 'NO_ENCONTRADO',
+    ESTADO_DNI_INVALIDO: 'DNI_INVALIDO',
+    ESTADO_ERROR: 'ERROR',
+}
+
+# El dígito verificador es 0-9 o una letra A-K; -1 = sin código
+_LETRAS = 'ABCDEFGHIJK'
+
+
+def codificar_verificador(codigo: Optional[str]) -> int:
+    """Convertir el código verificador a un entero pequeño (int8)"""
+    if not codigo:
+        return -1
+    codigo = str(codigo).strip().upper()
+    if len(codigo) == 1 and codigo.isdigit():
+        return int(codigo)
+    if len(codigo) == 1 and codigo in _LETRAS:
+        return 10 + _LETRAS.index(codigo)
+    return -1
+
+
+def decodificar_verificador(valor: int) -> Optional[str]:
+    if valor < 0:
+        return None
+    if valor < 10:
+        return str(valor)
+    return _LETRAS[valor - 10]
+
+
+class AlmacenResultados:
+    """
+    Resultados empaquetados: DNI como uint32, código verificador como int8,
+    estado como uint8 y departamento/provincia como índices a una tabla de nombres
+    (alrededor de 10 bytes por DNI)
+
+    Un DNI que no es de 8 dígitos no cabe en el arreglo: se guarda el texto original
+    aparte (posición -> texto), así no se exporta como "00000000" ni se pierde
+    """
+
+    def __init__(self):
+        self._dnis = array('I')
+        self._codigos = array('b')
+        self._estados = array('B')
+        self._departamentos = array('H')
+        self._provincias = array('H')
+        self._invalidos = {}
+        self._nombres = [None]
+        self._ids_nombres = {None: 0}
+
+    def _id_nombre(self, nombre: Optional[str]) -> int:
+        nombre = nombre or None
+        id_nombre = self._ids_nombres.get(nombre)
+        if id_nombre is None:
+            id_nombre = len(self._nombres)
+            self._nombres.append(nombre)
+            self._ids_nombres[nombre] = id_nombre
+        return id_nombre
+
+    def agregar(self, dni: str, codigo: Optional[str], departamento: Optional[str] = None,
+                provincia: Optional[str] = None, estado: Optional[int] = None):
+        """Agregar un resultado; si no se indica estado se deduce del código"""
+        dni = str(dni).strip()
+        dni_valido = len(dni) == 8 and dni.isdigit()
+        if estado is None:
+            if not dni_valido:
+                estado = ESTADO_DNI_INVALIDO
+            else:
+                estado = ESTADO_OK if codigo else ESTADO_NO_ENCONTRADO
+
+        if not dni_valido:
+            self._invalidos[len(self._dnis)] = dni
+        self._dnis.append(int(dni) if dni_valido else 0)
+        self._codigos.append(codificar_verificador(codigo))
+        self._estados.append(estado)
+        self._departamentos.append(self._id_nombre(departamento))
+        self._provincias.append(self._id_nombre(provincia))
+
+    def __len__(self) -> int:
+        return len(self._dnis)
+
+    def _dni(self, i: int) -> str:
+        if i in self._invalidos:
+            return self._invalidos[i]
+        return f"{self._dnis[i]:08d}"
+
+    def __iter__(self) -> Iterator[Tuple[str, Optional[str], Optional[str], Optional[str], str]]:
+        """Recorrer como (dni, codigo_verificador, departamento, provincia, estado)"""
+        for i in range(len(self._dnis)):
+            yield (
+                self._dni(i),
+                decodificar_verificador(self._codigos[i]),
+                self._nombres[self._departamentos[i]],
+                self._nombres[self._provincias[i]],
+                NOMBRES_ESTADO[self._estados[i]],
+            )
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria ocupada por los arreglos (sin contar la tabla de nombres)"""
+        return sum(a.itemsize * len(a) for a in
+                   (self._dnis, self._codigos, self._estados, self._departamentos, self._provincias))
+
+    def exitosos(self) -> int:
+        return self._estados.count(ESTADO_OK)
+
+    def a_dataframe(self):
+        """
+        Exportar a pandas sin pasar por objetos Python por fila
+
+        Columnas: DNI, CODIGO_VERIFICADOR, DEPARTAMENTO, PROVINCIA, ESTADO
+        """
+        import numpy as np
+        import pandas as pd
+
+        dnis = np.frombuffer(self._dnis, dtype=np.uint32)
+        codigos = np.frombuffer(self._codigos, dtype=np.int8)
+        estados = np.frombuffer(self._estados, dtype=np.uint8)
+        departamentos = np.frombuffer(self._departamentos, dtype=np.uint16)
+        provincias = np.frombuffer(self._provincias, dtype=np.uint16)
+
+        # Posición 0 = sin código (-1), luego 0-9 y A-K
+        tabla_codigos = np.array([None] + [decodificar_verificador(v) for v in range(10 + len(_LETRAS))], dtype=object)
+        # El índice 0 de la tabla de nombres es None → código de categoría -1 (NaN)
+        categorias = self._nombres[1:]
+
+        columna_dni = pd.Series(dnis).astype(str).str.zfill(8)
+        if self._invalidos:
+            columna_dni.loc[list(self._invalidos)] = list(self._invalidos.values())
+
+        return pd.DataFrame({
+            'DNI': columna_dni,
+            'CODIGO_VERIFICADOR': tabla_codigos[codigos.astype(np.int16) + 1],
+            'DEPARTAMENTO': pd.Categorical.from_codes(departamentos.astype(np.int32) - 1, categories=categorias),
+            'PROVINCIA': pd.Categorical.from_codes(provincias.astype(np.int32) - 1, categories=categorias),
+            'ESTADO': pd.Categorical.from_codes(estados.astype(np.int32), categories=list(NOMBRES_ESTADO.values())),
+        })
+
+    def a_diccionario(self) -> dict:
+        """Formato de DNIScraper.process_multiple_dnis (cada DNI inválido con su texto original como clave)"""
+        return {
+            dni: {
+                'codigo_verificador': codigo,
+                'departamento': departamento,
+                'provincia': provincia,
+                'success': estado == 'OK'
+            }
+            for dni, codigo, departamento, provincia, estado in self
+        }
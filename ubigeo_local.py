@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Resolución local de ubigeo a partir de la columna DEPART. / PROV/ DIST.
+Evita consultar el portal del Congreso cuando el nombre del distrito ya identifica el código
+"""
+
+import csv
+import difflib
+import logging
+import unicodedata
+import re
+from pathlib import Path
+from typing import Optional, Tuple
+
+import pandas as pd
+
+COLUMNA_UBICACION = 'DEPART. / PROV/ DIST.'
+ARCHIVO_INDICE = Path(__file__).with_name('ubigeos_inei.csv')
+
+# Abreviaturas y nombres coloquiales frecuentes en el registro
+ALIAS = {
+    'SJL': 'SAN JUAN DE LURIGANCHO',
+    'SJM': 'SAN JUAN DE MIRAFLORES',
+    'SMP': 'SAN MARTIN DE PORRES',
+    'VMT': 'VILLA MARIA DEL TRIUNFO',
+    'VES': 'VILLA EL SALVADOR',
+    'SURCO': 'SANTIAGO DE SURCO',
+    'MAGDALENA': 'MAGDALENA DEL MAR',
+    'CERCADO': 'LIMA',
+    'CERCADO DE LIMA': 'LIMA',
+    'LIMA CERCADO': 'LIMA',
+}
+
+# Similitud mínima para aceptar un nombre mal escrito
+UMBRAL_APROXIMADO = 0.85
+# Si el segundo candidato está a menos de esta distancia, la coincidencia es ambigua
+MARGEN_AMBIGUO = 0.05
+
+
+def normalizar_nombre(nombre) -> str:
+    """Mayúsculas, sin tildes, sin puntuación y con espacios simples"""
+    if nombre is None or (isinstance(nombre, float) and pd.isna(nombre)):
+        return ''
+    texto = unicodedata.normalize('NFKD', str(nombre))
+    texto = texto.encode('ascii', 'ignore').decode('ascii').upper()
+    texto = re.sub(r'\(.*?\)', ' ', texto)
+    texto = re.sub(r'[^A-Z0-9 ]', ' ', texto)
+    texto = re.sub(r'\s+', ' ', texto).strip()
+    return ALIAS.get(texto, texto)
+
+
+class IndiceUbigeo:
+    """Índice departamento/provincia/distrito → código de 6 dígitos"""
+
+    def __init__(self, archivo=ARCHIVO_INDICE):
+        self.logger = logging.getLogger(__name__)
+        self.codigos = {}
+        self.arbol = {}
+        self._cargar(archivo)
+
+    def _cargar(self, archivo):
+        with open(archivo, encoding='utf-8', newline='') as f:
+            for fila in csv.DictReader(f):
+                dep = normalizar_nombre(fila['DEPARTAMENTO'])
+                prov = normalizar_nombre(fila['PROVINCIA'])
+                dist = normalizar_nombre(fila['DISTRITO'])
+                self.codigos[(dep, prov, dist)] = fila['UBIGEO'].zfill(6)
+                self.arbol.setdefault(dep, {}).setdefault(prov, set()).add(dist)
+        self.logger.info(f"Índice de ubigeos cargado: {len(self.codigos)} distritos")
+
+    def _aproximar(self, nombre: str, opciones) -> Tuple[Optional[str], str]:
+        """Buscar el distrito más parecido dentro de una provincia; retorna (nombre, estado)"""
+        if nombre in opciones:
+            return nombre, 'exacto'
+
+        # Nombres recortados ("VICTOR LARCO" → "VICTOR LARCO HERRERA")
+        prefijos = [opcion for opcion in opciones if opcion.startswith(nombre + ' ')]
+        if len(prefijos) == 1:
+            return prefijos[0], 'aproximado'
+        if len(prefijos) > 1:
+            return None, 'ambiguo'
+
+        puntajes = sorted(
+            ((difflib.SequenceMatcher(None, nombre, opcion).ratio(), opcion) for opcion in opciones),
+            reverse=True
+        )
+        if not puntajes or puntajes[0][0] < UMBRAL_APROXIMADO:
+            return None, 'sin_match'
+        if len(puntajes) > 1 and puntajes[0][0] - puntajes[1][0] < MARGEN_AMBIGUO:
+            return None, 'ambiguo'
+        return puntajes[0][1], 'aproximado'
+
+    def resolver(self, departamento: str, provincia: str, distrito: str) -> Tuple[Optional[str], str]:
+        """
+        Resolver un ubigeo desde nombres ya normalizados
+
+        Returns:
+            (codigo, estado) con estado 'exacto', 'aproximado', 'ambiguo' o 'sin_match'
+        """
+        if not (departamento and provincia and distrito):
+            return None, 'sin_match'
+
+        codigo = self.codigos.get((departamento, provincia, distrito))
+        if codigo:
+            return codigo, 'exacto'
+
+        # Departamento y provincia solo por nombre exacto o ALIAS: un parecido ahí cambia
+        # toda la rama del árbol y el distrito aproximado terminaría en otra región
+        provincias = self.arbol.get(departamento)
+        if provincias is None or provincia not in provincias:
+            return None, 'sin_match'
+
+        dist, estado = self._aproximar(distrito, provincias[provincia])
+        if dist is None:
+            return None, estado
+        return self.codigos[(departamento, provincia, dist)], estado
+
+    def resolver_columna(self, serie: pd.Series) -> pd.DataFrame:
+        """
+        Resolver una columna 'DEPARTAMENTO/PROVINCIA/DISTRITO' completa
+
+        La normalización y la búsqueda exacta son vectorizadas; la búsqueda
+        aproximada solo se ejecuta una vez por cada valor distinto sin match.
+
+        Returns:
+            DataFrame con columnas UBIGEO y ESTADO, mismo índice que la serie
+        """
+        texto = (
+            serie.fillna('').astype(str)
+            .str.normalize('NFKD')
+            .str.encode('ascii', 'ignore').str.decode('ascii')
+            .str.upper()
+            .str.replace(r'\(.*?\)', ' ', regex=True)
+        )
+        partes = texto.str.split('/', n=3, expand=True).reindex(columns=range(3))
+        partes = partes.fillna('').apply(
+            lambda col: col.str.replace(r'[^A-Z0-9 ]', ' ', regex=True)
+                           .str.replace(r'\s+', ' ', regex=True)
+                           .str.strip()
+                           .replace(ALIAS)
+        )
+        claves = pd.Series(list(zip(partes[0], partes[1], partes[2])), index=serie.index)
+
+        resultado = pd.DataFrame(index=serie.index)
+        resultado['UBIGEO'] = claves.map(self.codigos)
+        resultado['ESTADO'] = 'exacto'
+
+        pendientes = resultado['UBIGEO'].isna()
+        if pendientes.any():
+            resueltos = {clave: self.resolver(*clave) for clave in claves[pendientes].unique()}
+            resultado.loc[pendientes, 'UBIGEO'] = claves[pendientes].map(lambda c: resueltos[c][0])
+            resultado.loc[pendientes, 'ESTADO'] = claves[pendientes].map(lambda c: resueltos[c][1])
+
+        vacios = (partes[0] == '') & (partes[1] == '') & (partes[2] == '')
+        resultado.loc[vacios, 'ESTADO'] = 'vacio'
+        return resultado
+
+
+def resolver_ubigeos_locales(df: pd.DataFrame, columna: str = COLUMNA_UBICACION,
+                             indice: IndiceUbigeo = None) -> pd.DataFrame:
+    """Atajo: resolver la columna de ubicación de un DataFrame con el índice incluido"""
+    if columna not in df.columns:
+        return pd.DataFrame({'UBIGEO': None, 'ESTADO': 'vacio'}, index=df.index)
+    indice = indice or IndiceUbigeo()
+    return indice.resolver_columna(df[columna])
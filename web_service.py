@@ -1,65 +1,121 @@
 #!/usr/bin/env python3
 """
 Web service wrapper para el procesador de DNIs
+
+El servicio solo importa Flask al arrancar: pandas, selenium y los navegadores
+se cargan recién cuando el planificador recibe su primera consulta, después de
+que el servidor ya está escuchando (para pasar los health checks de Cloud Run).
+
+Las consultas de un DNI (/lookup) y las filas de los lotes (/start, /jobs) pasan
+por el mismo planificador, que da prioridad a las consultas interactivas.
 """
+import time
+_INICIO_PROCESO = time.perf_counter()
+
 from flask import Flask, jsonify, request
 import threading
-import subprocess
 import os
+import re
 import glob
-import time
+from concurrent.futures import as_completed, TimeoutError as FuturoTimeout
+
+from planificador import Planificador
+from gobernador import obtener_gobernador
 
 app = Flask(__name__)
 process_thread = None
-process_status = {"status": "idle", "processed": 0, "total": 3000, "current_dni": None, "errors": 0}
+process_status = {"status": "idle", "processed": 0, "total": 0, "current_dni": None, "errors": 0, "eta_seconds": None}
+startup_report = {"imports_seconds": round(time.perf_counter() - _INICIO_PROCESO, 3), "ready_seconds": None}
+
+ARCHIVO_LOTE = "automate.csv"
+DELAY = float(os.environ.get('DELAY', 1))
+LOOKUP_TIMEOUT = float(os.environ.get('LOOKUP_TIMEOUT', 120))
+planificador = None
+_planificador_lock = threading.Lock()
+
+def crear_scraper():
+    """Navegador de un trabajador del planificador (selenium se importa recién aquí)"""
+    from dni_scraper import DNIScraper
+    return DNIScraper(headless=True, delay=DELAY)
+
+def consultar_dni(scraper, dni):
+    return scraper.get_codigo_verificador(dni)
+
+def obtener_planificador():
+    """Planificador compartido; los trabajadores abren su Chrome con la primera consulta"""
+    global planificador
+    with _planificador_lock:
+        if planificador is None:
+            from configuracion_logs import configurar_logging
+            configurar_logging('dni_procesamiento.log')
+            gobernador = obtener_gobernador()
+            gobernador.limpiar_huerfanos()
+            # No más navegadores de los que el contenedor soporta
+            trabajadores = min(int(os.environ.get('SCRAPER_WORKERS', 2)), gobernador.capacidad())
+            planificador = Planificador(
+                ejecutar=consultar_dni,
+                crear_recurso=crear_scraper,
+                trabajadores=trabajadores,
+                reserva_interactiva=int(os.environ.get('RESERVA_INTERACTIVA', 1)),
+                delay=DELAY,
+                retencion_lotes=float(os.environ.get('RETENCION_LOTES', 3600))
+            )
+        return planificador
 
 def run_processing():
-    """Ejecutar el procesamiento en background"""
-    global process_status
-    process_status["status"] = "running"
-    process_status["start_time"] = time.time()
+    """Procesar automate.csv como un lote del planificador (en background)"""
+    process_status.update(status="running", start_time=time.time(), processed=0, errors=0, eta_seconds=None)
     
     try:
-        # Ejecutar el procesamiento
-        process = subprocess.Popen(
-            ["python", "procesar_csv.py", "--archivo", "automate.csv", "--delay", "1"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
-        )
+        import pandas as pd
+        from procesar_csv import limpiar_dni
+        from estimador import EtaEnVivo, registrar_corrida
+        from archivo_respuestas import SITIO_ELDNI, valor_sin_resultado
         
-        # Leer output en tiempo real
-        for line in iter(process.stdout.readline, ''):
-            if line:
-                print(f"PROCESSING: {line.strip()}")
-                # Extraer información del procesamiento
-                if "Procesando fila" in line:
-                    try:
-                        parts = line.split(":")
-                        if len(parts) > 1:
-                            fila_info = parts[1].strip().split("/")
-                            if len(fila_info) >= 2:
-                                process_status["processed"] = int(fila_info[0])
-                                process_status["total"] = int(fila_info[1].split()[0])
-                    except:
-                        pass
-                elif "Procesando DNI:" in line:
-                    try:
-                        dni = line.split("Procesando DNI:")[-1].strip()
-                        process_status["current_dni"] = dni
-                    except:
-                        pass
-                elif "ERROR" in line or "WARNING" in line:
-                    process_status["errors"] += 1
+        df = pd.read_csv(ARCHIVO_LOTE, dtype={'D N I': str})
+        dni_column = next(col for col in df.columns if 'DNI' in col.upper() or 'D N I' in col.upper())
+        dnis = [limpiar_dni(valor) for valor in df[dni_column]]
+        filas_validas = [i for i, dni in enumerate(dnis) if dni]
         
-        process.wait()
+        df['CODIGO_VERIFICADOR'] = 'DNI_INVALIDO'
+        process_status["total"] = len(df)
+        procesados = len(df) - len(filas_validas)
         
-        if process.returncode == 0:
-            process_status["status"] = "completed"
-        else:
-            process_status["status"] = "error"
+        trabajo = obtener_planificador().enviar_lote(
+            [dnis[i] for i in filas_validas],
+            max_concurrencia=int(os.environ.get('BATCH_MAX_CONCURRENCIA', 1)),
+            nombre=ARCHIVO_LOTE
+        )
+        process_status["job_id"] = trabajo.id
+        fila_por_futuro = dict(zip(trabajo.futuros, filas_validas))
+        eta = EtaEnVivo(len(filas_validas))
+        inicio_consultas = time.time()
+        
+        for futuro in as_completed(trabajo.futuros):
+            i = fila_por_futuro[futuro]
+            try:
+                codigo, _, _ = futuro.result()
+            except Exception as e:
+                print(f"ERROR: DNI {dnis[i]}: {e}")
+                codigo = 'ERROR'
+            df.at[i, 'CODIGO_VERIFICADOR'] = codigo or valor_sin_resultado(SITIO_ELDNI, dnis[i])
+            if not codigo or codigo == 'ERROR':
+                process_status["errors"] += 1
+            
+            procesados += 1
+            eta.avanzar()
+            process_status["processed"] = procesados
+            process_status["current_dni"] = dnis[i]
+            process_status["eta_seconds"] = round(eta.segundos_restantes)
+            
+            # Guardar progreso cada 100 registros (lo lee /status)
+            if procesados % 100 == 0:
+                df.to_csv(f"automate_progreso_{procesados}.csv", index=False)
+        
+        df.to_csv(f"automate_con_codigos_0_{len(df)}.csv", index=False)
+        process_status.update(status="completed", eta_seconds=0)
+        registrar_corrida('codigos', len(filas_validas), time.time() - inicio_consultas, DELAY,
+                          trabajo.max_concurrencia)
             
     except Exception as e:
         process_status["status"] = "error"
@@ -76,21 +132,28 @@ def home():
         "total": process_status["total"],
         "current_dni": process_status.get("current_dni"),
         "errors": process_status["errors"],
-        "progress_percentage": round((process_status["processed"] / process_status["total"]) * 100, 2),
+        "progress_percentage": round((process_status["processed"] / max(process_status["total"], 1)) * 100, 2),
+        "eta_seconds": process_status["eta_seconds"],
         "uptime": time.time() - process_status.get("start_time", time.time())
     })
 
-@app.route('/start')
-def start_processing():
-    """Iniciar el procesamiento"""
+def iniciar_procesamiento():
+    """Lanzar el procesamiento en un hilo de fondo; retorna False si ya está corriendo"""
     global process_thread
     
     if process_status["status"] == "running":
-        return jsonify({"error": "Processing already running"}), 400
+        return False
     
     process_thread = threading.Thread(target=run_processing)
     process_thread.daemon = True
     process_thread.start()
+    return True
+
+@app.route('/start')
+def start_processing():
+    """Iniciar el procesamiento"""
+    if not iniciar_procesamiento():
+        return jsonify({"error": "Processing already running"}), 400
     
     return jsonify({"message": "Processing started", "status": "running"})
 
@@ -110,20 +173,112 @@ def get_status():
         "total": process_status["total"],
         "current_dni": process_status.get("current_dni"),
         "errors": process_status["errors"],
+        "eta_seconds": process_status["eta_seconds"],
         "progress_files": len(progress_files),
         "latest_progress_file": latest_file if progress_files else None
     })
 
+@app.route('/lookup/<dni>')
+def lookup(dni):
+    """Consulta interactiva de un DNI: pasa delante de las filas de los lotes"""
+    if not re.fullmatch(r'\d{8}', dni):
+        return jsonify({"error": "DNI inválido", "dni": dni}), 400
+    
+    inicio = time.time()
+    try:
+        codigo, departamento, provincia = obtener_planificador().consultar(dni, timeout=LOOKUP_TIMEOUT)
+    except FuturoTimeout:
+        return jsonify({"error": "Tiempo de espera agotado", "dni": dni}), 504
+    except Exception as e:
+        return jsonify({"error": str(e), "dni": dni}), 500
+    
+    return jsonify({
+        "dni": dni,
+        "codigo_verificador": codigo,
+        "departamento": departamento,
+        "provincia": provincia,
+        "success": codigo is not None,
+        "seconds": round(time.time() - inicio, 2)
+    })
+
+@app.route('/jobs', methods=['POST'])
+def crear_lote():
+    """Encolar un lote de DNIs: {"dnis": [...], "max_concurrencia": 1, "nombre": "..."}"""
+    datos = request.get_json(silent=True) or {}
+    dnis = datos.get("dnis")
+    if not isinstance(dnis, list) or not dnis:
+        return jsonify({"error": "Se requiere una lista 'dnis'"}), 400
+    dnis = [str(dni).strip() for dni in dnis]
+    invalidos = [dni for dni in dnis if not re.fullmatch(r'\d{8}', dni)]
+    if invalidos:
+        return jsonify({"error": "DNI inválido", "dnis_invalidos": invalidos}), 400
+    
+    try:
+        max_concurrencia = int(datos.get("max_concurrencia", 1))
+    except (TypeError, ValueError):
+        max_concurrencia = 0
+    if max_concurrencia < 1:
+        return jsonify({"error": "'max_concurrencia' debe ser un entero positivo"}), 400
+    
+    trabajo = obtener_planificador().enviar_lote(
+        dnis,
+        max_concurrencia=max_concurrencia,
+        nombre=datos.get("nombre", "")
+    )
+    return jsonify(trabajo.estado()), 202
+
+@app.route('/jobs/<int:id_trabajo>', methods=['GET', 'DELETE'])
+def ver_lote(id_trabajo):
+    """Estado y resultados ya obtenidos de un lote (DELETE descarta lo pendiente)"""
+    planificador_actual = obtener_planificador()
+    trabajo = planificador_actual.trabajo(id_trabajo)
+    if trabajo is None:
+        return jsonify({"error": "Lote no encontrado"}), 404
+    
+    if request.method == 'DELETE':
+        planificador_actual.cancelar(id_trabajo)
+        return jsonify(trabajo.estado())
+    
+    resultados = {}
+    for dni, futuro in zip(trabajo.items, trabajo.futuros):
+        if futuro.done() and not futuro.cancelled() and futuro.exception() is None:
+            codigo, departamento, provincia = futuro.result()
+            resultados[dni] = {"codigo_verificador": codigo, "departamento": departamento, "provincia": provincia}
+    estado = trabajo.estado()
+    estado["resultados"] = resultados
+    return jsonify(estado)
+
+@app.route('/scheduler')
+def scheduler_status():
+    """Colas del planificador: consultas interactivas en espera y lotes activos"""
+    return jsonify({**obtener_planificador().estado(), "recursos": obtener_gobernador().estado()})
+
 @app.route('/health')
 def health_check():
     """Health check para Cloud Run"""
     return jsonify({"status": "healthy", "service": "dni-automation"})
 
+@app.route('/startup')
+def startup_info():
+    """Tiempos de arranque del servicio (imports y tiempo hasta aceptar conexiones)"""
+    return jsonify(startup_report)
+
 if __name__ == '__main__':
-    # Auto-iniciar el procesamiento
+    from werkzeug.serving import make_server
+    
     print("🚀 Iniciando servicio de automatización DNI...")
-    start_processing()
     
-    # Ejecutar Flask
+    # Abrir el puerto antes de cualquier trabajo pesado
     port = int(os.environ.get('PORT', 8080))
-    app.run(host='0.0.0.0', port=port, debug=False)
\ No newline at end of file
+    server = make_server('0.0.0.0', port, app, threaded=True)
+    startup_report["ready_seconds"] = round(time.perf_counter() - _INICIO_PROCESO, 3)
+    print(f"⏱️  Imports: {startup_report['imports_seconds']}s | "
+          f"escuchando en :{port} a los {startup_report['ready_seconds']}s")
+    
+    # Auto-iniciar el procesamiento ya con el servidor escuchando
+    if os.environ.get('AUTO_START', '1') != '0':
+        auto_start = threading.Timer(float(os.environ.get('AUTO_START_DELAY', 1)), iniciar_procesamiento)
+        auto_start.daemon = True
+        auto_start.start()
+    
+    server.serve_forever()